@@ -0,0 +1,135 @@
+"""Resumo diário de atendimentos
+
+Revision ID: 3f8a6c1e9b24
+Revises: 9c2e51d0a7f3
+Create Date: 2026-10-18 11:40:05.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8a6c1e9b24'
+down_revision: Union[str, None] = '9c2e51d0a7f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The SQL is copied here, not imported from src.income_rollup, so this
+# revision keeps doing what it did when the application code changes.
+# The application may already have created these objects, hence the
+# IF NOT EXISTS everywhere.
+TRIGGER_NAMES = [
+    "resumo_diario_atendimento_insert",
+    "resumo_diario_atendimento_delete",
+    "resumo_diario_atendimento_update",
+    "resumo_diario_paciente_insert",
+    "resumo_diario_paciente_update",
+    "resumo_diario_paciente_delete",
+]
+
+ADD_APPOINTMENT = """
+        INSERT INTO resumo_diario
+            (day, patient_id, health_plan, appointment_count, therapist_income)
+        SELECT NEW.date, COALESCE(NEW.patient_id, 0), p.health_plan, 1,
+            COALESCE(p.clinic_value * (p.therapist_percentage / 100.0), 0.0)
+        FROM (SELECT 1) LEFT JOIN pacientes p ON p.id = NEW.patient_id
+        WHERE NEW.date IS NOT NULL
+        ON CONFLICT (day, patient_id) DO UPDATE SET
+            appointment_count = appointment_count + 1,
+            therapist_income = therapist_income + excluded.therapist_income;"""
+
+REMOVE_APPOINTMENT = """
+        UPDATE resumo_diario SET
+            appointment_count = appointment_count - 1,
+            therapist_income = therapist_income - COALESCE(
+                (SELECT COALESCE(
+                    p.clinic_value * (p.therapist_percentage / 100.0), 0.0
+                ) FROM pacientes p WHERE p.id = OLD.patient_id),
+                0.0
+            )
+        WHERE day = OLD.date AND patient_id = COALESCE(OLD.patient_id, 0);
+        DELETE FROM resumo_diario
+        WHERE day = OLD.date AND patient_id = COALESCE(OLD.patient_id, 0)
+            AND appointment_count <= 0;"""
+
+REPRICE_PATIENT = """
+        UPDATE resumo_diario SET
+            health_plan = NEW.health_plan,
+            therapist_income = appointment_count * COALESCE(
+                NEW.clinic_value * (NEW.therapist_percentage / 100.0), 0.0
+            )
+        WHERE patient_id = NEW.id;"""
+
+TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_atendimento_insert
+    AFTER INSERT ON atendimentos
+    BEGIN{ADD_APPOINTMENT}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_atendimento_delete
+    AFTER DELETE ON atendimentos
+    BEGIN{REMOVE_APPOINTMENT}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_atendimento_update
+    AFTER UPDATE OF date, patient_id ON atendimentos
+    WHEN OLD.date IS NOT NEW.date OR OLD.patient_id IS NOT NEW.patient_id
+    BEGIN{REMOVE_APPOINTMENT}{ADD_APPOINTMENT}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_paciente_insert
+    AFTER INSERT ON pacientes
+    BEGIN{REPRICE_PATIENT}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_paciente_update
+    AFTER UPDATE OF health_plan, clinic_value, therapist_percentage ON pacientes
+    BEGIN{REPRICE_PATIENT}
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS resumo_diario_paciente_delete
+    AFTER DELETE ON pacientes
+    BEGIN
+        UPDATE resumo_diario SET health_plan = NULL, therapist_income = 0.0
+        WHERE patient_id = OLD.id;
+    END""",
+]
+
+# Regenerates the whole rollup, whatever it held before
+REBUILD = [
+    "DELETE FROM resumo_diario",
+    """INSERT INTO resumo_diario
+        (day, patient_id, health_plan, appointment_count, therapist_income)
+    SELECT a.date, COALESCE(a.patient_id, 0), p.health_plan, COUNT(*),
+        COUNT(*) * COALESCE(p.clinic_value * (p.therapist_percentage / 100.0), 0.0)
+    FROM atendimentos a LEFT JOIN pacientes p ON p.id = a.patient_id
+    WHERE a.date IS NOT NULL
+    GROUP BY a.date, COALESCE(a.patient_id, 0)""",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "resumo_diario",  # Keep the table name in Portuguese
+        sa.Column("day", sa.Date, primary_key=True),
+        sa.Column("patient_id", sa.Integer, primary_key=True),
+        sa.Column("health_plan", sa.String, nullable=True),
+        sa.Column("appointment_count", sa.Integer, nullable=False),
+        sa.Column("therapist_income", sa.Float, nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_resumo_diario_patient_id_day",
+        "resumo_diario",
+        ["patient_id", "day"],
+        if_not_exists=True,
+    )
+    for statement in TRIGGERS + REBUILD:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for trigger in TRIGGER_NAMES:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.drop_index("ix_resumo_diario_patient_id_day", table_name="resumo_diario")
+    op.drop_table("resumo_diario")
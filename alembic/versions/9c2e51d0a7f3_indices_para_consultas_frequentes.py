@@ -0,0 +1,47 @@
+"""Índices para consultas frequentes
+
+Revision ID: 9c2e51d0a7f3
+Revises: 4bd74897acbb
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2e51d0a7f3'
+down_revision: Union[str, None] = '4bd74897acbb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The application creates missing indexes itself when it opens a
+    # database, so they may already be there
+    op.create_index("ix_pacientes_name", "pacientes", ["name"], if_not_exists=True)
+    op.create_index(
+        "ix_pacientes_health_plan", "pacientes", ["health_plan"], if_not_exists=True
+    )
+    op.create_index(
+        "ix_atendimentos_date_patient_id",
+        "atendimentos",
+        ["date", "patient_id"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_atendimentos_patient_id_date",
+        "atendimentos",
+        ["patient_id", "date"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_atendimentos_patient_id_date", table_name="atendimentos")
+    op.drop_index("ix_atendimentos_date_patient_id", table_name="atendimentos")
+    op.drop_index("ix_pacientes_health_plan", table_name="pacientes")
+    op.drop_index("ix_pacientes_name", table_name="pacientes")
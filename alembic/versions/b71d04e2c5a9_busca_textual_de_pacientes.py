@@ -0,0 +1,67 @@
+"""Busca textual de pacientes
+
+Revision ID: b71d04e2c5a9
+Revises: 3f8a6c1e9b24
+Create Date: 2026-10-18 14:03:52.661920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy.exc import OperationalError
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71d04e2c5a9'
+down_revision: Union[str, None] = '3f8a6c1e9b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copied from src.patient_search so this revision does not change with the
+# application code. IF NOT EXISTS: the application may have created them.
+FTS_TABLE = """CREATE VIRTUAL TABLE IF NOT EXISTS pacientes_fts USING fts5(
+    name,
+    health_plan,
+    content='pacientes',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)"""
+
+TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS pacientes_fts_insert AFTER INSERT ON pacientes
+    BEGIN
+        INSERT INTO pacientes_fts (rowid, name, health_plan)
+        VALUES (NEW.id, NEW.name, NEW.health_plan);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pacientes_fts_delete AFTER DELETE ON pacientes
+    BEGIN
+        INSERT INTO pacientes_fts (pacientes_fts, rowid, name, health_plan)
+        VALUES ('delete', OLD.id, OLD.name, OLD.health_plan);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pacientes_fts_update
+    AFTER UPDATE OF id, name, health_plan ON pacientes
+    BEGIN
+        INSERT INTO pacientes_fts (pacientes_fts, rowid, name, health_plan)
+        VALUES ('delete', OLD.id, OLD.name, OLD.health_plan);
+        INSERT INTO pacientes_fts (rowid, name, health_plan)
+        VALUES (NEW.id, NEW.name, NEW.health_plan);
+    END""",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    try:
+        op.execute(FTS_TABLE)
+    except OperationalError:
+        return  # SQLite without FTS5, searches use LIKE
+    for trigger in TRIGGERS:
+        op.execute(trigger)
+    op.execute("INSERT INTO pacientes_fts (pacientes_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for trigger in ("pacientes_fts_insert", "pacientes_fts_delete", "pacientes_fts_update"):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS pacientes_fts")
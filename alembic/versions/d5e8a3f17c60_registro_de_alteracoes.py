@@ -0,0 +1,67 @@
+"""Registro de alterações para exportação incremental
+
+Revision ID: d5e8a3f17c60
+Revises: b71d04e2c5a9
+Create Date: 2026-10-18 15:12:47.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8a3f17c60'
+down_revision: Union[str, None] = 'b71d04e2c5a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copied from src.change_log so this revision does not change with the
+# application code. IF NOT EXISTS: the application may have created them.
+TRACKED_TABLES = ("pacientes", "atendimentos")
+EVENTS = (("I", "INSERT", "NEW"), ("U", "UPDATE", "NEW"), ("D", "DELETE", "OLD"))
+TRIGGER_NAMES = [
+    f"alteracoes_{table}_{event_name.lower()}"
+    for table in TRACKED_TABLES
+    for _, event_name, _ in EVENTS
+]
+TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS alteracoes_{table}_{event_name.lower()}
+    AFTER {event_name} ON {table}
+    BEGIN
+        INSERT INTO alteracoes (table_name, row_id, operation)
+        VALUES ('{table}', {row}.id, '{operation}');
+    END"""
+    for table in TRACKED_TABLES
+    for operation, event_name, row in EVENTS
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "alteracoes",  # Keep the table name in Portuguese
+        sa.Column("seq", sa.Integer, primary_key=True),
+        sa.Column("table_name", sa.String, nullable=False),
+        sa.Column("row_id", sa.Integer, nullable=False),
+        sa.Column("operation", sa.String(1), nullable=False),
+        sqlite_autoincrement=True,
+        if_not_exists=True,
+    )
+    op.create_table(
+        "marcas_exportacao",  # Keep the table name in Portuguese
+        sa.Column("name", sa.String, primary_key=True),
+        sa.Column("seq", sa.Integer, nullable=False),
+        if_not_exists=True,
+    )
+    for trigger in TRIGGERS:
+        op.execute(trigger)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for trigger in TRIGGER_NAMES:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.drop_table("marcas_exportacao")
+    op.drop_table("alteracoes")
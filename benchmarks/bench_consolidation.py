@@ -0,0 +1,84 @@
+"""Compare serial and parallel consolidation of several clinic databases.
+
+Usage::
+
+    python -m benchmarks.bench_consolidation [--databases N] [--appointments M]
+        [--workers 1 2 4]
+
+Generates ``N`` synthetic databases with ``benchmarks.generate_data``, then
+times ``src.consolidation.consolidate`` over all of them with each worker
+count and checks that every run gives the same combined totals. Some
+patients of the first database have no health plan, as after importing a
+sheet with empty cells. The gain grows with the number of cores and the
+size of each database.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.generate_data import generate
+from src.consolidation import consolidate
+
+
+def clear_health_plans(path, every=10):
+    """Leave every ``every``-th patient of ``path`` without a health plan."""
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.execute(
+                "UPDATE pacientes SET health_plan = NULL WHERE id % ? = 0", (every,)
+            )
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--databases", type=int, default=24)
+    parser.add_argument("--patients", type=int, default=300)
+    parser.add_argument("--appointments", type=int, default=50000)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1]
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="my_income_psy_bench_") as directory:
+        paths = [
+            os.path.join(directory, f"clinic_{number:02d}.db")
+            for number in range(args.databases)
+        ]
+        for seed, path in enumerate(paths):
+            generate(path, args.patients, args.appointments, seed=seed)
+        clear_health_plans(paths[0])
+
+        # Loads the modules the serial runs would otherwise pay for once
+        _, expected = consolidate(paths, workers=1)
+        failures = 0
+        if None not in expected.attendances_by_health_plan:
+            print("The patients without a health plan are missing from the totals")
+            failures += 1
+        print(
+            f"{'workers':>8} {'best (s)':>9} {'databases/s':>12} "
+            f"{'same totals':>12}"
+        )
+        for workers in args.workers:
+            best = None
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                _, combined = consolidate(paths, workers=workers)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            same = combined == expected
+            failures += not same
+            print(
+                f"{workers:>8} {best:>9.3f} {len(paths) / best:>12.1f} "
+                f"{'yes' if same else 'NO':>12}"
+            )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,67 @@
+"""Compare the SQLite performance profiles of ``src.models.database``.
+
+Usage::
+
+    python -m benchmarks.bench_db_profiles [--appointments N] [--commit-every N]
+
+For each profile it imports synthetic sessions committing through
+``session_scope`` (as the session form does), then times the statistics
+queries over the whole history.
+"""
+import argparse
+from datetime import date
+
+from benchmarks.common import appointment_rows, patient_rows, temp_database, timed
+from src.IncomeAnalysis import IncomeAnalysis
+from src.models.database import PERFORMANCE_PROFILES
+from src.models.models import Appointment, Patient
+from src.stats_cache import statistics_cache
+from src.utils import session_scope
+
+
+def run_profile(profile, patients, appointments, commit_every, repeats):
+    results = {}
+    with temp_database(profile):
+        with timed(results, "import_s"):
+            with session_scope() as session:
+                session.bulk_insert_mappings(Patient, patients)
+            for start in range(0, len(appointments), commit_every):
+                with session_scope() as session:
+                    session.bulk_insert_mappings(
+                        Appointment, appointments[start:start + commit_every]
+                    )
+
+        analysis = IncomeAnalysis(date(2020, 1, 1), date(2023, 12, 31))
+        with timed(results, "statistics_s"):
+            for _ in range(repeats):
+                # The cache is not keyed by database; time the query itself
+                statistics_cache.clear()
+                analysis.calculate_statistics()
+    results["statistics_s"] /= repeats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=300)
+    parser.add_argument("--appointments", type=int, default=20000)
+    parser.add_argument("--commit-every", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    patients = patient_rows(args.patients)
+    appointments = appointment_rows(args.appointments, args.patients)
+
+    print(f"{'profile':<10} {'import (s)':>12} {'statistics (ms)':>16}")
+    for profile in PERFORMANCE_PROFILES:
+        results = run_profile(
+            profile, patients, appointments, args.commit_every, args.repeats
+        )
+        print(
+            f"{profile:<10} {results['import_s']:>12.3f} "
+            f"{results['statistics_s'] * 1000:>16.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
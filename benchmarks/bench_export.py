@@ -0,0 +1,92 @@
+"""Measure the spreadsheet export on growing databases.
+
+Usage::
+
+    python -m benchmarks.bench_export [--sizes 10000 100000 1000000]
+
+For each size it fills a scratch database with synthetic appointments, then
+exports it in a separate process so the reported peak RSS only covers the
+export. Reports rows per second and peak RSS. The Python heap stays flat
+with a streaming export; what growth remains is SQLite's page cache and
+memory-mapped pages, which the database profile caps (``cache_size`` and
+``mmap_size``).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import fill_database, peak_rss_mb, temp_database
+
+PATIENTS = 500
+
+
+def export():
+    """Child process: export the database it is pointed at and report."""
+    from src.spreadsheet_integration import SpreadsheetIntegration
+
+    output = sys.argv[2]
+    start = time.perf_counter()
+    patients, appointments = SpreadsheetIntegration().export_to_spreadsheet(output)
+    elapsed = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "rows": patients + appointments,
+                "seconds": elapsed,
+                "peak_rss_mb": peak_rss_mb(),
+            }
+        )
+    )
+
+
+def run_size(appointments, directory):
+    database_path = os.path.join(directory, f"export_{appointments}.db")
+    with temp_database() as engine:
+        fill_database(PATIENTS, appointments)
+        # Closing the connections checkpoints the WAL into the file, which
+        # is then handed over to the child process
+        engine.dispose()
+        os.replace(engine.url.database, database_path)
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.bench_export",
+            "--export",
+            os.path.join(directory, f"export_{appointments}.xlsx"),
+        ],
+        env=dict(os.environ, MY_INCOME_PSY_DATABASE_PATH=database_path),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    args = parser.parse_args()
+
+    print(f"{'appointments':>12} {'rows/s':>10} {'seconds':>9} {'peak RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory(prefix="my_income_psy_bench_") as directory:
+        for size in args.sizes:
+            results = run_size(size, directory)
+            print(
+                f"{size:>12} {results['rows'] / results['seconds']:>10.0f} "
+                f"{results['seconds']:>9.2f} {results['peak_rss_mb']:>14.1f}"
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--export":
+        export()
+    else:
+        main()
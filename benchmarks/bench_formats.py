@@ -0,0 +1,75 @@
+"""Compare the interchange formats of ``src.spreadsheet_formats``.
+
+Usage::
+
+    python -m benchmarks.bench_formats [--appointments N]
+
+For each format it exports a synthetic database, imports the files into an
+empty database and checks that every patient and appointment came back
+identical. Reports the export and import times and the size on disk, and
+exits with status 1 if a round trip lost or changed data.
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.common import appointment_rows, patient_rows, temp_database, timed
+from src.models.models import Appointment, Patient
+from src.read_models import appointment_export_rows, patient_export_rows
+from src.spreadsheet_formats import format_for
+from src.spreadsheet_integration import SpreadsheetIntegration
+from src.utils import session_scope
+
+FILE_NAMES = ["backup.xlsx", "backup.csv.gz", "backup.parquet"]
+
+
+def snapshot():
+    with session_scope() as session:
+        return patient_export_rows(session), appointment_export_rows(session)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--appointments", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(
+        f"{'format':<16} {'export (s)':>11} {'import (s)':>11} "
+        f"{'size (KB)':>10} {'round trip':>11}"
+    )
+    failures = 0
+    with tempfile.TemporaryDirectory(prefix="my_income_psy_bench_") as directory:
+        with temp_database():
+            with session_scope() as session:
+                session.bulk_insert_mappings(Patient, patient_rows(args.patients))
+                session.bulk_insert_mappings(
+                    Appointment, appointment_rows(args.appointments, args.patients)
+                )
+            expected = snapshot()
+            results = {}
+            for name in FILE_NAMES:
+                with timed(results, (name, "export")):
+                    SpreadsheetIntegration().export_to_spreadsheet(
+                        os.path.join(directory, name)
+                    )
+
+        for name in FILE_NAMES:
+            file_path = os.path.join(directory, name)
+            paths = format_for(file_path).dataset_paths(file_path)
+            with temp_database():
+                with timed(results, (name, "import")):
+                    SpreadsheetIntegration().import_files(paths)
+                identical = snapshot() == expected
+            failures += not identical
+            size = sum(os.path.getsize(path) for path in paths) / 1024
+            print(
+                f"{name:<16} {results[name, 'export']:>11.2f} "
+                f"{results[name, 'import']:>11.2f} {size:>10.0f} "
+                f"{'identical' if identical else 'DIFFERENT':>11}"
+            )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
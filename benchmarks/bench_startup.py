@@ -0,0 +1,104 @@
+"""Measure how long the application takes to start.
+
+Reports the slowest imports of ``controller`` (``python -X importtime``) and
+the time from launching the process to the first paint of the window, for
+the source tree and optionally for a PyInstaller build of ``main.spec``::
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --exe dist/main
+
+Exits with status 1 when a measurement is above its threshold, so it can
+guard against startup regressions. The first paint needs a display.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds; generous enough for a slow laptop, low enough to catch pandas or
+# every view being imported again before the first window
+IMPORT_THRESHOLD = 1.0
+FIRST_PAINT_THRESHOLD = 2.5
+
+
+def import_times(module="controller"):
+    """Return ``[(module, cumulative seconds)]`` for the import of ``module``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(cumulative) / 1e6))
+    return times
+
+
+def first_paint(command, database_path):
+    """Seconds from launching ``command`` until it reports its first paint."""
+    with tempfile.TemporaryDirectory(prefix="my_income_psy_startup_") as directory:
+        probe = os.path.join(directory, "first_paint")
+        env = dict(
+            os.environ,
+            MY_INCOME_PSY_STARTUP_PROBE=probe,
+            MY_INCOME_PSY_DATABASE_PATH=database_path,
+        )
+        start = time.time()
+        result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+        if result.returncode or not os.path.exists(probe):
+            raise RuntimeError(result.stderr.strip() or "no first paint reported")
+        with open(probe) as painted:
+            return float(painted.read()) - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--exe", help="PyInstaller build of main.spec to measure too")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--import-threshold", type=float, default=IMPORT_THRESHOLD)
+    parser.add_argument(
+        "--first-paint-threshold", type=float, default=FIRST_PAINT_THRESHOLD
+    )
+    args = parser.parse_args()
+
+    failures = 0
+    times = import_times()
+    total = dict(times)["controller"]
+    print(f"import controller: {total:.3f}s")
+    for name, seconds in sorted(times, key=lambda item: -item[1])[1 : args.top + 1]:
+        print(f"  {seconds:8.3f}s  {name}")
+    failures += total > args.import_threshold
+
+    builds = [("source", [sys.executable, "main.py"])]
+    if args.exe:
+        builds.append(("pyinstaller", [os.path.abspath(args.exe)]))
+    with tempfile.TemporaryDirectory(prefix="my_income_psy_startup_") as directory:
+        database_path = os.path.join(directory, "startup.db")
+        for name, command in builds:
+            try:
+                # The best run: the others mostly measure a cold disk cache
+                best = min(
+                    first_paint(command, database_path) for _ in range(args.runs)
+                )
+            except RuntimeError as error:
+                print(f"first paint ({name}): failed: {error}")
+                failures += 1
+                continue
+            print(f"first paint ({name}): {best:.3f}s")
+            failures += best > args.first_paint_threshold
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,311 @@
+"""Time the main operations of the application on a synthetic database.
+
+Usage::
+
+    python -m benchmarks.bench_suite [--patients N] [--appointments M]
+        [--database bench.db] [--output results.json] [--compare old.json]
+
+Cases:
+
+- ``statistics.*``: ``IncomeAnalysis.calculate_statistics`` for each filter
+  branch, with a cold statistics cache;
+- ``export.*`` / ``import.*``: the spreadsheet integration in each format,
+  importing into an empty database every run;
+- ``search.*``: the patient list search and count;
+- ``sessions.*``: the session list query, first page, filtered and deep in
+  the history.
+
+Each case runs ``--repeats`` times (``--heavy-repeats`` for export and
+import) and reports latency percentiles, then runs once more under
+``tracemalloc`` for the peak Python memory; SQLite's own allocations are
+not included. ``--output`` saves the results as JSON; ``--compare`` reads
+such a file from another commit and exits with status 1 when a median got
+slower by more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+from benchmarks.common import (
+    HEALTH_PLANS,
+    fill_database,
+    peak_rss_mb,
+    temp_database,
+    use_engine,
+)
+from src.IncomeAnalysis import IncomeAnalysis
+from src.models import database
+from src.models.models import Appointment, Patient
+from src.read_models import count_patients, patient_rows, session_rows
+from src.spreadsheet_formats import format_for
+from src.spreadsheet_integration import SpreadsheetIntegration
+from src.stats_cache import statistics_cache
+from src.utils import session_scope
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_DAY = date(2015, 1, 1)
+YEARS = 10
+EXPORT_FILES = ["export.xlsx", "export.csv.gz", "export.parquet"]
+# Rows per page of the patient and session lists
+PAGE_SIZE = 50
+
+
+def percentile(samples, fraction):
+    """Linear interpolation between the closest ranks of ``samples``."""
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def timed_call(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def measure(run, repeats, fresh_database=False):
+    """
+    Time ``repeats`` calls of ``run``, then trace one more for its peak
+    memory. With ``fresh_database`` each call gets an empty database, created
+    outside the timing.
+    """
+
+    def call():
+        if not fresh_database:
+            return timed_call(run)
+        with temp_database():
+            return timed_call(run)
+
+    samples = [call() for _ in range(repeats)]
+
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    samples_ms = [sample * 1000 for sample in samples]
+    return {
+        "samples_ms": samples_ms,
+        "mean_ms": sum(samples_ms) / len(samples_ms),
+        "p50_ms": percentile(samples_ms, 0.5),
+        "p90_ms": percentile(samples_ms, 0.9),
+        "p99_ms": percentile(samples_ms, 0.99),
+        "max_ms": max(samples_ms),
+        "peak_kb": peak / 1024,
+    }
+
+
+def statistics_cases(patient_name):
+    """One case per filter branch of ``IncomeAnalysis.filters``."""
+    last_year = date(FIRST_DAY.year + YEARS - 1, 1, 1)
+    analyses = {
+        "all": IncomeAnalysis(None, None),
+        "date_range": IncomeAnalysis(last_year, last_year.replace(month=12, day=31)),
+        "patient": IncomeAnalysis(None, None, selected_patient=patient_name),
+        "health_plan": IncomeAnalysis(
+            None, None, selected_health_plan=HEALTH_PLANS[0]
+        ),
+        "all_filters": IncomeAnalysis(
+            last_year,
+            last_year.replace(month=12, day=31),
+            patient_name,
+            HEALTH_PLANS[0],
+        ),
+    }
+
+    def case(analysis):
+        def run():
+            statistics_cache.clear()
+            analysis.calculate_statistics()
+
+        return run
+
+    return {
+        f"statistics.{name}": case(analysis) for name, analysis in analyses.items()
+    }
+
+
+def read_cases(search_text):
+    def query(function, *args):
+        def run():
+            with session_scope() as session:
+                function(session, *args)
+
+        return run
+
+    middle = FIRST_DAY.replace(year=FIRST_DAY.year + YEARS // 2)
+    return {
+        "search.list_all": query(patient_rows, "", 0, PAGE_SIZE),
+        "search.list_matches": query(patient_rows, search_text, 0, PAGE_SIZE),
+        "search.count_matches": query(count_patients, search_text),
+        "sessions.first_page": query(session_rows, (), None, PAGE_SIZE),
+        "sessions.filtered": query(
+            session_rows,
+            (Appointment.record_done, Appointment.date >= middle),
+            None,
+            PAGE_SIZE,
+        ),
+        "sessions.deep_page": query(session_rows, (), (middle, 0), PAGE_SIZE),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args, directory):
+    """Run every case on the bound database; returns ``(sizes, results)``."""
+    results = {}
+    with session_scope() as session:
+        sizes = {
+            "patients": session.query(Patient).count(),
+            "appointments": session.query(Appointment).count(),
+        }
+        patient_name = session.query(Patient.name).order_by(Patient.id).first()[0]
+    # The first name of a patient matches a fair share of the others
+    search_text = patient_name.split()[0]
+
+    cases = {**statistics_cases(patient_name), **read_cases(search_text)}
+    for name, run in cases.items():
+        results[name] = measure(run, args.repeats)
+        report(name, results[name])
+
+    integration = SpreadsheetIntegration()
+    for file_name in EXPORT_FILES:
+        file_path = os.path.join(directory, file_name)
+        name = f"export.{file_name.split('.', 1)[1]}"
+        results[name] = measure(
+            lambda: integration.export_to_spreadsheet(file_path), args.heavy_repeats
+        )
+        report(name, results[name])
+
+    for file_name in EXPORT_FILES:
+        file_path = os.path.join(directory, file_name)
+        paths = format_for(file_path).dataset_paths(file_path)
+        name = f"import.{file_name.split('.', 1)[1]}"
+        results[name] = measure(
+            lambda: integration.import_files(paths),
+            args.heavy_repeats,
+            fresh_database=True,
+        )
+        report(name, results[name])
+    return sizes, results
+
+
+def report(name, result):
+    print(
+        f"{name:<26} {result['p50_ms']:>10.2f} {result['p90_ms']:>10.2f} "
+        f"{result['max_ms']:>10.2f} {result['peak_kb']:>12.0f}"
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Print the median of each case against ``baseline``; count regressions."""
+    print(f"\n{'case':<26} {'before (ms)':>12} {'after (ms)':>12} {'change':>8}")
+    regressions = 0
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["p50_ms"], result["p50_ms"]
+        change = after / before - 1 if before else 0.0
+        slower = change > tolerance
+        regressions += slower
+        print(
+            f"{name:<26} {before:>12.2f} {after:>12.2f} {change:>+8.0%}"
+            + ("  SLOWER" if slower else "")
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--appointments", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--database",
+        help="existing throwaway database to measure, e.g. from "
+        "benchmarks.generate_data, instead of generating one",
+    )
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--heavy-repeats", type=int, default=3)
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(
+        f"{'case':<26} {'p50 (ms)':>10} {'p90 (ms)':>10} {'max (ms)':>10} "
+        f"{'peak (KB)':>12}"
+    )
+    with tempfile.TemporaryDirectory(prefix="my_income_psy_bench_") as directory:
+        if args.database:
+            engine = database.create_db_engine(
+                f"sqlite:///{os.path.abspath(args.database)}"
+            )
+            database.init_db(engine)
+            with use_engine(engine):
+                sizes, results = run_suite(args, directory)
+            engine.dispose()
+        else:
+            with temp_database():
+                fill_database(
+                    args.patients,
+                    args.appointments,
+                    first_day=FIRST_DAY,
+                    years=YEARS,
+                    seed=args.seed,
+                )
+                sizes, results = run_suite(args, directory)
+
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "database": args.database,
+            **sizes,
+            "seed": None if args.database else args.seed,
+            "repeats": args.repeats,
+            "heavy_repeats": args.heavy_repeats,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "cases": results,
+    }
+    print(f"\npeak RSS: {output['meta']['peak_rss_mb']:.1f} MB")
+    if args.output:
+        with open(args.output, "w") as results_file:
+            json.dump(output, results_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["cases"]
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
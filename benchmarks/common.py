@@ -0,0 +1,144 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks run from the repository root, e.g.
+``python -m benchmarks.bench_db_profiles``. They never touch the real
+database: each run works on a throwaway SQLite file.
+"""
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+# Point the application at a scratch database before src.models is imported
+_scratch_dir = tempfile.mkdtemp(prefix="my_income_psy_bench_")
+os.environ.setdefault(
+    "MY_INCOME_PSY_DATABASE_PATH", os.path.join(_scratch_dir, "scratch.db")
+)
+
+from src.models import database  # noqa: E402
+from src.models.models import WeekDays  # noqa: E402
+
+HEALTH_PLANS = ["UNIMED", "BRADESCO", "AMIL", "SULAMERICA", "PARTICULAR"]
+FIRST_NAMES = (
+    "Ana Beatriz Bruno Camila Carlos Daniel Eduarda Felipe Gabriela Helena Igor "
+    "João Juliana Lucas Marcos Maria Mariana Pedro Rafael Sofia Tiago Vitória"
+).split()
+LAST_NAMES = (
+    "Almeida Barbosa Carvalho Costa Ferreira Gomes Lima Martins Oliveira "
+    "Pereira Ribeiro Rodrigues Santos Silva Souza"
+).split()
+# Appointments generated and inserted at a time while filling a database
+FILL_CHUNK_SIZE = 50000
+
+
+@contextmanager
+def use_engine(engine):
+    """Bind the application sessions to ``engine`` inside the block."""
+    previous_bind = database.SessionLocal.kw["bind"]
+    database.SessionLocal.configure(bind=engine)
+    try:
+        yield engine
+    finally:
+        database.SessionLocal.configure(bind=previous_bind)
+
+
+@contextmanager
+def temp_database(profile=None):
+    """Bind the application sessions to a fresh database using ``profile``."""
+    with tempfile.TemporaryDirectory(prefix="my_income_psy_bench_") as directory:
+        engine = database.create_db_engine(
+            f"sqlite:///{os.path.join(directory, 'bench.db')}", profile
+        )
+        database.init_db(engine)
+        try:
+            with use_engine(engine):
+                yield engine
+        finally:
+            engine.dispose()
+
+
+@contextmanager
+def timed(results, name):
+    """Store the wall time of the block, in seconds, under ``results[name]``."""
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+def patient_rows(count, seed=0):
+    rng = random.Random(seed)
+    days = list(WeekDays)
+    return [
+        {
+            "id": patient_id,
+            # The id keeps names unique, so one patient can be filtered by name
+            "name": (
+                f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} "
+                f"{patient_id:05d}"
+            ),
+            "attendance_day": rng.choice(days),
+            "time": f"{rng.randint(8, 19):02d}:00",
+            "health_plan": rng.choice(HEALTH_PLANS),
+            "clinic_value": float(rng.choice([80, 120, 150, 200])),
+            "therapist_percentage": float(rng.choice([50, 60, 70])),
+        }
+        for patient_id in range(1, count + 1)
+    ]
+
+
+def appointment_rows(
+    count, patient_count, first_day=date(2020, 1, 1), years=4, seed=0, first_id=1
+):
+    rng = random.Random(seed)
+    span = 365 * years
+    return [
+        {
+            "id": appointment_id,
+            "date": first_day + timedelta(days=rng.randrange(span)),
+            "patient_id": rng.randint(1, patient_count),
+            "record_done": rng.random() < 0.9,
+            "record_launched": rng.random() < 0.8,
+        }
+        for appointment_id in range(first_id, first_id + count)
+    ]
+
+
+def fill_database(
+    patients, appointments, first_day=date(2020, 1, 1), years=4, seed=0
+):
+    """
+    Insert ``patients`` and ``appointments`` seeded synthetic rows through
+    the application sessions, in chunks so memory stays flat. The database
+    triggers keep the income rollup, search index and change log up to date
+    as they would in the application.
+    """
+    from src.models.models import Appointment, Patient
+    from src.utils import session_scope
+
+    with session_scope() as session:
+        session.bulk_insert_mappings(Patient, patient_rows(patients, seed))
+    for start in range(0, appointments, FILL_CHUNK_SIZE):
+        count = min(FILL_CHUNK_SIZE, appointments - start)
+        with session_scope() as session:
+            session.bulk_insert_mappings(
+                Appointment,
+                appointment_rows(
+                    count,
+                    patients,
+                    first_day=first_day,
+                    years=years,
+                    # Every chunk draws its own values, the same for a seed
+                    seed=f"{seed}:{start}",
+                    first_id=start + 1,
+                ),
+            )
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
@@ -0,0 +1,75 @@
+"""Fill a new SQLite file with a seeded synthetic practice.
+
+Usage::
+
+    python -m benchmarks.generate_data bench.db [--patients N]
+        [--appointments M] [--first-year Y] [--years Y] [--seed S]
+
+Patients get random names, attendance days and health plans; appointments
+are spread over ``years`` years from the start of ``first-year``. The same
+arguments always produce the same rows. Open the file in the application to
+try the screens on a large history::
+
+    MY_INCOME_PSY_DATABASE_PATH=bench.db python main.py
+"""
+import argparse
+import os
+import time
+from datetime import date
+
+from benchmarks.common import fill_database, use_engine
+from src.models import database
+
+
+def generate(path, patients, appointments, first_year=2015, years=10, seed=0):
+    """Create ``path`` with the application schema and fill it."""
+    engine = database.create_db_engine(f"sqlite:///{os.path.abspath(path)}")
+    try:
+        database.init_db(engine)
+        with use_engine(engine):
+            fill_database(
+                patients,
+                appointments,
+                first_day=date(first_year, 1, 1),
+                years=years,
+                seed=seed,
+            )
+    finally:
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="SQLite file to create")
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--appointments", type=int, default=100000)
+    parser.add_argument("--first-year", type=int, default=2015)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--force", action="store_true", help="replace the file if it exists"
+    )
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        if not args.force:
+            parser.error(f"{args.path} already exists; use --force to replace it")
+        os.remove(args.path)
+
+    start = time.perf_counter()
+    generate(
+        args.path,
+        args.patients,
+        args.appointments,
+        args.first_year,
+        args.years,
+        args.seed,
+    )
+    print(
+        f"{args.patients} patients and {args.appointments} appointments written "
+        f"to {args.path} in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
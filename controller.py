@@ -1,42 +1,122 @@
+import importlib
+import threading
 import tkinter as tk
+from collections import OrderedDict
 
-from views.patient_form import PatientFormView
-from views.patient_list import PatientListView
-from views.session_form import SessionFormView
-from views.statistics_form import StatisticsView
-from views.spreadsheet_integration_form import SpreadsheetIntegrationForm
+from src import data_events, instrumentation
+from src.settings import get_setting
+
+# View modules are only imported on first navigation, so the ones not
+# opened yet (and tkcalendar, pandas...) do not delay the first window
+VIEW_CLASSES = {
+    "patient_form": ("views.patient_form", "PatientFormView"),
+    "patient_list": ("views.patient_list", "PatientListView"),
+    "session_form": ("views.session_form", "SessionFormView"),
+    "statistics": ("views.statistics_form", "StatisticsView"),
+    "spreedsheet_integration": (
+        "views.spreadsheet_integration_form",
+        "SpreadsheetIntegrationForm",
+    ),
+}
+
+
+def view_class(name):
+    module_name, class_name = VIEW_CLASSES[name]
+    return getattr(importlib.import_module(module_name), class_name)
 
 
 class AppController(tk.Frame):
-    def __init__(self, master):
+    """
+    Keeps the views alive between navigations instead of rebuilding them.
+    Hidden views are only refreshed when shown again after a change to the
+    models listed in their ``depends_on``. Views may define:
+
+    - ``refresh()``: reload their data after such a change;
+    - ``open(**kwargs)``: prepare the view each time it is shown, with the
+      arguments given to ``show_view``, e.g. the patient to edit.
+    """
+
+    def __init__(self, master, max_views=None):
         super().__init__(master)
-        self.views = {}
-        # self.create_views()
+        # Least recently shown first
+        self.views = OrderedDict()
+        self.dirty = set()
+        self.current = None
+        self.max_views = int(
+            max_views or get_setting("views", "cached", len(VIEW_CLASSES))
+        )
+
+        # Changes are published from the database worker threads; only
+        # record them there and apply them on the Tk thread
+        self.changed_models = set()
+        self.changes_lock = threading.Lock()
+        data_events.subscribe(self.on_data_changes)
+        self.bind("<Destroy>", self.on_destroy, add="+")
+
+        self.debug_overlay = None
+        self.bind_all("<F12>", self.toggle_debug_overlay)
+
         self.show_view("patient_list")
 
+    def on_data_changes(self, changes):
+        with self.changes_lock:
+            self.changed_models.update(change.model for change in changes)
+
+    def on_destroy(self, event):
+        if event.widget is self:
+            data_events.unsubscribe(self.on_data_changes)
+
+    def mark_dirty(self):
+        """Flag the views that depend on the models changed since last time"""
+        with self.changes_lock:
+            changed, self.changed_models = self.changed_models, set()
+        for name, view in self.views.items():
+            if changed.intersection(getattr(view, "depends_on", ())):
+                self.dirty.add(name)
+
+    def toggle_debug_overlay(self, event=None):
+        """Show or hide the per action SQL and latency overlay"""
+        if self.debug_overlay is None:
+            from views.debug_overlay import DebugOverlay
+
+            self.debug_overlay = DebugOverlay(self)
+        self.debug_overlay.toggle()
+
     def show_view(self, name, **kwargs):
-        # Destroy all existing views
-        for view_name, view in self.views.items():
-            if view:
-                view.destroy()
-        self.views = {}
-
-        # Recreate the desired view
-        if name == "patient_form":
-            self.views["patient_form"] = PatientFormView(
-                self, self.show_view, patient_id=kwargs.get("patient_id")
-            )
-        elif name == "patient_list":
-            self.views["patient_list"] = PatientListView(self, self.show_view)
-        elif name == "session_form":
-            self.views["session_form"] = SessionFormView(self, self.show_view)
-        elif name == "statistics":
-            self.views["statistics"] = StatisticsView(self, self.show_view)
-        elif name == "spreedsheet_integration":
-            self.views["spreedsheet_integration"] = SpreadsheetIntegrationForm(
-                self, self.show_view
-            )
-
-        # Grid the desired view
-        current_view = self.views[name]
-        current_view.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+        with instrumentation.action(f"show {name}"):
+            self._show_view(name, **kwargs)
+
+    def _show_view(self, name, **kwargs):
+        self.mark_dirty()
+        if self.current is not None and self.current != name:
+            self.views[self.current].place_forget()
+
+        view = self.views.get(name)
+        if view is None:
+            view = view_class(name)(self, self.show_view)
+            self.views[name] = view
+        elif name in self.dirty and hasattr(view, "refresh"):
+            view.refresh()
+        self.dirty.discard(name)
+        self.views.move_to_end(name)
+
+        if hasattr(view, "open"):
+            view.open(**kwargs)
+
+        self.current = name
+        view.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+        if self.debug_overlay is not None and self.debug_overlay.winfo_ismapped():
+            self.debug_overlay.lift()
+        self.evict(keep=self.max_views)
+
+    def evict(self, keep=1):
+        """
+        Destroy the least recently shown hidden views until at most ``keep``
+        views are alive, e.g. to free memory. They are rebuilt when shown.
+        """
+        for name in list(self.views):
+            if len(self.views) <= keep:
+                break
+            if name != self.current:
+                self.views.pop(name).destroy()
+                self.dirty.discard(name)
@@ -6,7 +6,15 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # The views are imported on first navigation, out of sight of the analysis
+    hiddenimports=[
+        'views.patient_form',
+        'views.patient_list',
+        'views.session_form',
+        'views.statistics_form',
+        'views.spreadsheet_integration_form',
+        'views.debug_overlay',
+    ],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
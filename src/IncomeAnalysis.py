@@ -1,14 +1,25 @@
 from datetime import date
-from .models.models import Appointment, Patient
-from sqlalchemy import func
+from typing import Optional
+from .models.models import Appointment, IncomeRollup, Patient
+from sqlalchemy import case, func, select
+from .stats_cache import CacheKey, statistics_cache
 from .utils import session_scope
 
+# SQLite expression giving the first day of the period containing a day,
+# and the matching pandas frequency used to fill periods without sessions
+PERIODS = {
+    "day": (func.date(IncomeRollup.day), "D"),
+    "week": (func.date(IncomeRollup.day, "weekday 0", "-6 days"), "W-MON"),
+    "month": (func.strftime("%Y-%m-01", IncomeRollup.day), "MS"),
+    "year": (func.strftime("%Y-01-01", IncomeRollup.day), "YS"),
+}
+
 
 class IncomeAnalysis:
     def __init__(
         self,
-        start_date: date,
-        end_date: date,
+        start_date: Optional[date],
+        end_date: Optional[date],
         selected_patient: str = "All",
         selected_health_plan: str = "All",
     ):
@@ -17,9 +28,109 @@ class IncomeAnalysis:
         self.selected_patient = selected_patient
         self.selected_health_plan = selected_health_plan
 
+    def filters(self):
+        """
+        Builds the filter conditions for the selected date range, patient and
+        health plan. Any combination may be used; ``None`` dates and "All"
+        leave that side unfiltered.
+        """
+        conditions = []
+        if self.start_date is not None:
+            conditions.append(IncomeRollup.day >= self.start_date)
+        if self.end_date is not None:
+            conditions.append(IncomeRollup.day <= self.end_date)
+        if self.selected_patient != "All":
+            # Names are not unique; use the lowest id, as find_by_name does
+            conditions.append(
+                IncomeRollup.patient_id
+                == select(func.min(Patient.id))
+                .where(Patient.name == self.selected_patient)
+                .scalar_subquery()
+            )
+        if self.selected_health_plan != "All":
+            conditions.append(IncomeRollup.health_plan == self.selected_health_plan)
+        return conditions
+
+    def statistics_query(self, session):
+        """
+        Returns the query computing, per health plan in a single scan of the
+        daily rollup:
+        - the number of appointments,
+        - the number of those appointments whose patient still exists,
+        - the therapist income.
+
+        The rollup has at most one row per day and patient, so the cost does
+        not grow with the number of sessions. Appointments of deleted patients
+        have no health plan or income but still count towards the total, as
+        they always did.
+        """
+        return (
+            session.query(
+                IncomeRollup.health_plan,
+                func.sum(IncomeRollup.appointment_count),
+                func.sum(
+                    case(
+                        (Patient.id.isnot(None), IncomeRollup.appointment_count),
+                        else_=0,
+                    )
+                ),
+                func.sum(IncomeRollup.therapist_income),
+            )
+            .outerjoin(Patient, IncomeRollup.patient_id == Patient.id)
+            .filter(*self.filters())
+            .group_by(IncomeRollup.health_plan)
+        )
+
+    def appointment_statistics_query(self, session):
+        """
+        Same rows as ``statistics_query``, read from the appointments. For
+        databases that predate the daily rollup and cannot be given one,
+        e.g. opened read-only; it scans the appointments in the range.
+        """
+        conditions = []
+        if self.start_date is not None:
+            conditions.append(Appointment.date >= self.start_date)
+        if self.end_date is not None:
+            conditions.append(Appointment.date <= self.end_date)
+        if self.selected_patient != "All":
+            conditions.append(
+                Appointment.patient_id
+                == select(func.min(Patient.id))
+                .where(Patient.name == self.selected_patient)
+                .scalar_subquery()
+            )
+        if self.selected_health_plan != "All":
+            conditions.append(Patient.health_plan == self.selected_health_plan)
+        return (
+            session.query(
+                Patient.health_plan,
+                func.count(Appointment.id),
+                func.sum(case((Patient.id.isnot(None), 1), else_=0)),
+                func.sum(
+                    func.coalesce(
+                        Patient.clinic_value * (Patient.therapist_percentage / 100.0),
+                        0.0,
+                    )
+                ),
+            )
+            .outerjoin(Patient, Appointment.patient_id == Patient.id)
+            .filter(Appointment.date.isnot(None), *conditions)
+            .group_by(Patient.health_plan)
+        )
+
+    def cache_key(self, granularity=None):
+        return CacheKey(
+            self.start_date,
+            self.end_date,
+            self.selected_patient,
+            self.selected_health_plan,
+            granularity,
+        )
+
     def calculate_statistics(self):
         """
         Calculates the statistics for the given date range and filters.
+        Results are served from ``statistics_cache`` until the data changes.
 
         Returns:
             A tuple containing:
@@ -27,122 +138,102 @@ class IncomeAnalysis:
             - attendances_by_health_plan: A dictionary with the number of attendances for each health plan.
             - total_therapist_income: The total income for the therapist.
         """
-        with session_scope() as session:
-            if self.selected_patient != "All":
-                patient = session.query(Patient).filter(Patient.name == self.selected_patient).first()
-                if not patient:
-                    return 0, {}, 0.0
-
-                query = session.query(Appointment).filter(
-                    Appointment.date >= self.start_date,
-                    Appointment.date <= self.end_date,
-                    Appointment.patient_id == patient.id
-                )
-
-                total_attendances = query.count()
-
-                attendances_by_health_plan_dict = {patient.health_plan: total_attendances}
-
-                total_therapist_income = (
-                    session.query(
-                        func.sum(
-                            Patient.clinic_value * (Patient.therapist_percentage / 100)
-                        )
-                    )
-                    .join(Appointment, Appointment.patient_id == Patient.id)
-                    .filter(Appointment.patient_id == patient.id,
-                            Appointment.date >= self.start_date,
-                            Appointment.date <= self.end_date)
-                    .scalar()
-                )
-
-                if total_therapist_income is None:
-                    total_therapist_income = 0.0
-
-            elif self.selected_health_plan != "All":
-                query = session.query(Appointment).join(Patient).filter(
-                    Appointment.date >= self.start_date,
-                    Appointment.date <= self.end_date,
-                    Patient.health_plan == self.selected_health_plan
-                )
-
-                total_attendances = query.count()
-
-                attendances_by_health_plan = (
-                    session.query(Patient.health_plan, func.count(Appointment.id))
-                    .join(Appointment, Patient.id == Appointment.patient_id)
-                    .filter(
-                        Appointment.date >= self.start_date,
-                        Appointment.date <= self.end_date,
-                        Patient.health_plan == self.selected_health_plan
-                    )
-                    .group_by(Patient.health_plan)
-                    .all()
-                )
-
-                attendances_by_health_plan_dict = {}
-                for plan, count in attendances_by_health_plan:
-                    attendances_by_health_plan_dict[plan] = count
+        key = self.cache_key()
+        cached = statistics_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = statistics_cache.generation
 
-                total_therapist_income = (
-                    session.query(
-                        func.sum(
-                            Patient.clinic_value * (Patient.therapist_percentage / 100)
-                        )
-                    )
-                    .join(Appointment, Patient.id == Appointment.patient_id)
-                    .filter(
-                        Appointment.date >= self.start_date,
-                        Appointment.date <= self.end_date,
-                        Patient.health_plan == self.selected_health_plan
-                    )
-                    .scalar()
-                )
-
-                if total_therapist_income is None:
-                    total_therapist_income = 0.0
-            else:
-                query = session.query(Appointment).filter(
-                    Appointment.date >= self.start_date,
-                    Appointment.date <= self.end_date,
-                )
-
-                total_attendances = query.count()
+        with session_scope() as session:
+            rows = self.statistics_query(session).all()
+
+        total_attendances = 0
+        attendances_by_health_plan_dict = {}
+        total_therapist_income = 0.0
+        for plan, count, patient_count, income in rows:
+            total_attendances += count
+            if patient_count:
+                attendances_by_health_plan_dict[plan] = patient_count
+            total_therapist_income += income or 0.0
+
+        statistics = (
+            total_attendances,
+            attendances_by_health_plan_dict,
+            total_therapist_income,
+        )
+        statistics_cache.put(key, statistics, generation)
+        return statistics
+
+    def series(self, granularity: str = "month"):
+        """
+        Calculates attendances and therapist income per period.
 
-                attendances_by_health_plan = (
-                    session.query(Patient.health_plan, func.count(Appointment.id))
-                    .join(Appointment, Patient.id == Appointment.patient_id)
-                    .filter(
-                        Appointment.date >= self.start_date,
-                        Appointment.date <= self.end_date,
-                    )
-                    .group_by(Patient.health_plan)
-                    .all()
-                )
+        Args:
+            granularity: "day", "week" (starting on Monday), "month" or "year".
 
-                attendances_by_health_plan_dict = {}
-                for plan, count in attendances_by_health_plan:
-                    attendances_by_health_plan_dict[plan] = count
+        Returns:
+            A DataFrame with one row per period, health plan and patient, and
+            the columns period (first day of the period), health_plan,
+            patient, attendances and income. Periods without sessions are
+            absent; use ``totals_by_period`` for a gap-free trend. Cached like
+            ``calculate_statistics``.
+        """
+        if granularity not in PERIODS:
+            raise ValueError(
+                f"Unknown granularity '{granularity}'. "
+                f"Choose one of: {', '.join(PERIODS)}"
+            )
+        import pandas as pd  # Loaded on first use to keep startup fast
+
+        key = self.cache_key(granularity)
+        cached = statistics_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = statistics_cache.generation
+        period = PERIODS[granularity][0].label("period")
 
-                total_therapist_income = (
-                    session.query(
-                        func.sum(
-                            Patient.clinic_value * (Patient.therapist_percentage / 100)
-                        )
-                    )
-                    .join(Appointment, Patient.id == Appointment.patient_id)
-                    .filter(
-                        Appointment.date >= self.start_date,
-                        Appointment.date <= self.end_date,
-                    )
-                    .scalar()
+        with session_scope() as session:
+            rows = (
+                session.query(
+                    period,
+                    IncomeRollup.health_plan,
+                    Patient.name,
+                    func.sum(IncomeRollup.appointment_count),
+                    func.sum(IncomeRollup.therapist_income),
                 )
+                .outerjoin(Patient, IncomeRollup.patient_id == Patient.id)
+                .filter(*self.filters())
+                .group_by(period, IncomeRollup.health_plan, Patient.name)
+                .order_by(period)
+                .all()
+            )
+
+        series = pd.DataFrame(
+            rows, columns=["period", "health_plan", "patient", "attendances", "income"]
+        )
+        series["period"] = pd.to_datetime(series["period"])
+        statistics_cache.put(key, series, generation)
+        return series
+
+    def totals_by_period(self, granularity: str = "month"):
+        """
+        Sums ``series`` over health plans and patients.
 
-                if total_therapist_income is None:
-                    total_therapist_income = 0.0
-
-            return (
-                total_attendances,
-                attendances_by_health_plan_dict,
-                total_therapist_income,
-            )
\ No newline at end of file
+        Returns:
+            A DataFrame indexed by period with the columns attendances and
+            income, including zero rows for periods without sessions.
+        """
+        import pandas as pd
+
+        series = self.series(granularity)
+        totals = series.groupby("period")[["attendances", "income"]].sum()
+
+        start = self.start_date if self.start_date is not None else totals.index.min()
+        end = self.end_date if self.end_date is not None else totals.index.max()
+        if pd.isna(start) or pd.isna(end):
+            return totals
+        offset = pd.tseries.frequencies.to_offset(PERIODS[granularity][1])
+        periods = pd.date_range(
+            offset.rollback(pd.Timestamp(start)), end, freq=offset, name="period"
+        )
+        return totals.reindex(periods, fill_value=0)
@@ -0,0 +1,306 @@
+"""Online snapshots of the SQLite database, with rotation and restore.
+
+Snapshots use SQLite's online backup API, copying a batch of pages at a
+time with a short pause in between, so the application keeps reading and
+saving while a snapshot is taken. In WAL mode the copy reads from a fixed
+snapshot of the database; with a rollback journal a write makes SQLite
+restart the copy, and after a few restarts it is finished in one step.
+
+Snapshots are named after the database and the second they were taken,
+e.g. ``psychology-20240131-235900.db``; one taken within the same second as
+another gets a ``-2``, ``-3``... suffix instead of replacing it.
+
+Each snapshot is checked with ``PRAGMA integrity_check`` before it replaces
+the partial file, so a corrupt copy is never kept and the live file is never
+scanned.
+
+While the application runs, ``backup_scheduler`` takes a snapshot every
+``interval_hours`` on a background thread and keeps the newest ``keep``::
+
+    [backup]
+    # Folder of the snapshots, next to the database by default
+    directory = backups
+    # 0 turns the scheduled snapshots off
+    interval_hours = 24
+    keep = 7
+
+Snapshots can also be taken, listed and restored from the command line
+(``python -m src.cli backup``, ``backups`` and ``restore``).
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from .settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Pages copied per step, and the pause between steps so writers get in
+PAGES_PER_STEP = 256
+STEP_PAUSE_S = 0.005
+# Restarts tolerated before copying a rollback-journal database in one step
+MAX_RESTARTS = 3
+SNAPSHOT_SUFFIX = ".db"
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+# Seconds before the first scheduled snapshot, to keep startup quiet
+STARTUP_DELAY_S = 60
+
+Snapshot = namedtuple("Snapshot", ["path", "created", "size"])
+
+
+class BackupCancelled(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+class IntegrityError(sqlite3.DatabaseError):
+    """The snapshot failed ``PRAGMA integrity_check``."""
+
+
+def database_path():
+    from .models.database import DATABASE_PATH
+
+    return DATABASE_PATH
+
+
+def backup_directory(source=None):
+    source = source or database_path()
+    directory = get_setting("backup", "directory", "backups")
+    return os.path.join(os.path.dirname(os.path.abspath(source)), directory)
+
+
+def _prefix(source):
+    return os.path.splitext(os.path.basename(source))[0] + "-"
+
+
+def integrity_problems(connection):
+    """The messages of ``PRAGMA integrity_check``; empty when it passes."""
+    rows = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    return [] if rows == ["ok"] else rows
+
+
+def copy_database(
+    source,
+    target,
+    pages=PAGES_PER_STEP,
+    pause=STEP_PAUSE_S,
+    cancelled=None,
+    check=True,
+):
+    """
+    Copy ``source`` into ``target`` with the online backup API, a batch of
+    ``pages`` at a time, then check ``target`` unless ``check`` is false.
+    ``cancelled`` is polled between batches and aborts the copy with
+    ``BackupCancelled``.
+    """
+    if not os.path.exists(source):
+        # sqlite3 would create an empty database instead
+        raise FileNotFoundError(f"No database at {source}")
+    copied = {"remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        if cancelled is not None and cancelled():
+            raise BackupCancelled
+        if copied["remaining"] is not None and remaining > copied["remaining"]:
+            # A write from another connection sent the copy back to the start
+            copied["restarts"] += 1
+            if copied["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts
+        copied["remaining"] = remaining
+        time.sleep(pause)
+
+    source_connection = sqlite3.connect(source, isolation_level=None)
+    target_connection = sqlite3.connect(target)
+    try:
+        journal_mode = source_connection.execute("PRAGMA journal_mode").fetchone()[0]
+        if journal_mode == "wal":
+            # Copy from a read snapshot: writers carry on in the WAL without
+            # sending the copy back to the start
+            source_connection.execute("BEGIN")
+            source_connection.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        try:
+            source_connection.backup(
+                target_connection, pages=pages, progress=progress
+            )
+        except _TooManyRestarts:
+            # Busy rollback-journal database: copy in one step, holding the
+            # read lock for the whole copy
+            source_connection.backup(target_connection)
+        problems = integrity_problems(target_connection) if check else []
+        if problems:
+            raise IntegrityError(f"{target}: {'; '.join(problems[:5])}")
+    finally:
+        target_connection.close()
+        source_connection.close()
+
+
+def snapshot(source=None, directory=None, cancelled=None):
+    """
+    Take a checked snapshot of ``source`` (the application database by
+    default) into ``directory``. Returns the new ``Snapshot``.
+    """
+    source = source or database_path()
+    directory = directory or backup_directory(source)
+    os.makedirs(directory, exist_ok=True)
+
+    created = datetime.now().replace(microsecond=0)
+    path, partial = _reserve(
+        os.path.join(directory, _prefix(source) + created.strftime(TIMESTAMP_FORMAT))
+    )
+    try:
+        copy_database(source, partial, cancelled=cancelled)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return _snapshot(path, created)
+
+
+def _reserve(base):
+    """
+    A snapshot path that is not taken, ``base`` or ``base-2``, ``base-3``...
+    for snapshots taken within the same second, and its partial file, which
+    is created so a concurrent snapshot cannot pick the same path.
+    """
+    sequence = 1
+    while True:
+        path = base + (f"-{sequence}" if sequence > 1 else "") + SNAPSHOT_SUFFIX
+        partial = path + ".partial"
+        if not os.path.exists(path):
+            try:
+                open(partial, "x").close()
+                return path, partial
+            except FileExistsError:
+                pass
+        sequence += 1
+
+
+def _parse_name(stem):
+    """The time and same-second sequence of a snapshot name, or ValueError."""
+    try:
+        return datetime.strptime(stem, TIMESTAMP_FORMAT), 1
+    except ValueError:
+        timestamp, _, sequence = stem.rpartition("-")
+        if not sequence.isdigit():
+            raise
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT), int(sequence)
+
+
+def _snapshot(path, created):
+    return Snapshot(path, created, os.path.getsize(path))
+
+
+def list_snapshots(source=None, directory=None):
+    """The snapshots of ``source``, newest first."""
+    source = source or database_path()
+    directory = directory or backup_directory(source)
+    if not os.path.isdir(directory):
+        return []
+    prefix = _prefix(source)
+    snapshots = []
+    for name in os.listdir(directory):
+        if not (name.startswith(prefix) and name.endswith(SNAPSHOT_SUFFIX)):
+            continue
+        try:
+            created, sequence = _parse_name(name[len(prefix):-len(SNAPSHOT_SUFFIX)])
+        except ValueError:
+            continue  # Not a snapshot, e.g. a copy renamed by hand
+        snapshots.append(
+            (created, sequence, _snapshot(os.path.join(directory, name), created))
+        )
+    snapshots.sort(key=lambda entry: entry[:2], reverse=True)
+    return [entry[2] for entry in snapshots]
+
+
+def rotate(source=None, directory=None, keep=None):
+    """Delete all but the newest ``keep`` snapshots; returns the deleted ones."""
+    keep = int(keep if keep is not None else get_setting("backup", "keep", 7))
+    expired = list_snapshots(source, directory)[max(keep, 1):]
+    for expired_snapshot in expired:
+        os.remove(expired_snapshot.path)
+    return expired
+
+
+def restore(snapshot_path, target=None):
+    """
+    Replace the contents of ``target`` (the application database by default)
+    with a snapshot, after checking the snapshot. The current contents are
+    first saved as a snapshot of their own. Close the application first.
+    Returns that safety snapshot, or None if ``target`` did not exist.
+    """
+    target = target or database_path()
+    if not os.path.exists(snapshot_path):
+        raise FileNotFoundError(f"No snapshot at {snapshot_path}")
+    connection = sqlite3.connect(snapshot_path)
+    try:
+        problems = integrity_problems(connection)
+    finally:
+        connection.close()
+    if problems:
+        raise IntegrityError(f"{snapshot_path}: {'; '.join(problems[:5])}")
+
+    safety = snapshot(target) if os.path.exists(target) else None
+    copy_database(snapshot_path, target, pause=0, check=False)
+    return safety
+
+
+class BackupScheduler:
+    """Takes a snapshot every ``interval_hours`` on a daemon thread."""
+
+    def __init__(self, interval_hours=24.0, keep=7):
+        self.interval = interval_hours * 3600
+        self.keep = keep
+        self.last_snapshot = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="db-backup", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread, cancelling a snapshot in progress."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def seconds_until_due(self):
+        snapshots = list_snapshots()
+        if not snapshots:
+            return STARTUP_DELAY_S
+        age = (datetime.now() - snapshots[0].created).total_seconds()
+        return max(self.interval - age, STARTUP_DELAY_S)
+
+    def _run(self):
+        while not self._stop.wait(self.seconds_until_due()):
+            try:
+                self.last_snapshot = snapshot(cancelled=self._stop.is_set)
+                rotate(keep=self.keep)
+                self.last_error = None
+            except BackupCancelled:
+                return
+            except Exception as error:
+                # Try again at the next interval instead of ending the thread
+                self.last_error = error
+                logger.warning("Scheduled backup failed: %s", error)
+                if self._stop.wait(self.interval):
+                    return
+
+
+backup_scheduler = BackupScheduler(
+    float(get_setting("backup", "interval_hours", 24)),
+    int(get_setting("backup", "keep", 7)),
+)
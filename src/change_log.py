@@ -0,0 +1,98 @@
+"""Change tracking for ``pacientes`` and ``atendimentos``.
+
+SQLite triggers append one ``alteracoes`` row per inserted, updated or
+deleted row, whichever code path wrote it (ORM, bulk import, Alembic). The
+incremental export reads the rows changed after the watermark of its backup
+destination, then moves that watermark. Each destination has a named
+watermark, and the log is only pruned up to the oldest of them, so one
+backup chain never loses the changes another one still needs.
+"""
+from sqlalchemy import event, func, select
+
+from .models.models import Base, ChangeLog, ExportWatermark
+
+TRACKED_TABLES = ("pacientes", "atendimentos")
+# Watermark of the backups made from the application
+DEFAULT_WATERMARK = "backup"
+
+
+def _trigger(table, operation, event_name, row):
+    return f"""CREATE TRIGGER IF NOT EXISTS alteracoes_{table}_{event_name.lower()}
+    AFTER {event_name} ON {table}
+    BEGIN
+        INSERT INTO alteracoes (table_name, row_id, operation)
+        VALUES ('{table}', {row}.id, '{operation}');
+    END"""
+
+
+TRIGGERS = [
+    _trigger(table, operation, event_name, row)
+    for table in TRACKED_TABLES
+    for operation, event_name, row in (
+        ("I", "INSERT", "NEW"),
+        ("U", "UPDATE", "NEW"),
+        ("D", "DELETE", "OLD"),
+    )
+]
+TRIGGER_NAMES = [
+    f"alteracoes_{table}_{event_name}"
+    for table in TRACKED_TABLES
+    for event_name in ("insert", "update", "delete")
+]
+
+
+def install_triggers(connection):
+    for trigger in TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+
+def last_seq(session):
+    """Sequence number of the latest change, 0 if none was ever logged."""
+    latest = session.execute(select(func.max(ChangeLog.seq))).scalar()
+    return latest or 0
+
+
+def watermark(session, name=DEFAULT_WATERMARK):
+    mark = session.get(ExportWatermark, name)
+    return mark.seq if mark else 0
+
+
+def save_watermark(session, seq, name=DEFAULT_WATERMARK):
+    """
+    Remember that changes up to ``seq`` were exported to the ``name``
+    destination, and forget those every watermark has passed.
+    """
+    mark = session.get(ExportWatermark, name)
+    if mark is None:
+        session.add(ExportWatermark(name=name, seq=seq))
+    else:
+        mark.seq = seq
+    session.flush()
+    oldest = session.execute(select(func.min(ExportWatermark.seq))).scalar()
+    session.query(ChangeLog).filter(ChangeLog.seq <= oldest).delete(
+        synchronize_session=False
+    )
+
+
+def changed_ids(session, table, since, until):
+    """IDs of the rows of ``table`` changed in ``(since, until]``."""
+    return [
+        row_id
+        for (row_id,) in session.execute(
+            select(ChangeLog.row_id)
+            .where(
+                ChangeLog.table_name == table,
+                ChangeLog.seq > since,
+                ChangeLog.seq <= until,
+            )
+            .distinct()
+            .order_by(ChangeLog.row_id)
+        )
+    ]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_new_change_log(target, connection, tables=(), **kw):
+    # Runs once every table exists, since the triggers reference all of them
+    if ChangeLog.__table__ in tables:
+        install_triggers(connection)
@@ -0,0 +1,368 @@
+"""Command line interface for batch jobs, without Tk or a display.
+
+Usage::
+
+    python -m src.cli [--database FILE] [--format json|csv] COMMAND ...
+
+Commands:
+
+- ``stats``: totals of ``IncomeAnalysis`` for one or more date ranges, e.g.
+  ``stats --range 2024-01-01:2024-06-30 --range 2024-07-01: --health-plan X``;
+- ``series``: attendances and income per day, week, month or year;
+- ``aggregate DB...``: statistics of several databases, queried in
+  parallel, and their sum;
+- ``export FILE`` / ``export --changes FILE``: full or incremental backup;
+  ``--watermark NAME`` makes a full export the base of the ``NAME`` chain;
+- ``import FILE...``: spreadsheet import, ``--changes`` for incremental
+  backups;
+- ``rebuild``: regenerate the daily rollup and the patient search index;
+- ``verify``: compare the daily rollup with the appointments;
+- ``backup`` / ``backups`` / ``restore SNAPSHOT``: take a checked snapshot
+  of the database and rotate the old ones, list them, or restore one.
+
+Results are written to stdout as JSON (default) or CSV. Errors go to
+stderr with exit status 1; ``verify`` also exits with 1 when the rollup is
+out of date, and ``aggregate`` when a database could not be read.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+from datetime import date
+
+
+def date_range(text):
+    """Parse ``START:END``, either side ISO formatted or empty for no limit."""
+    start, separator, end = text.partition(":")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected START:END, got '{text}'")
+    try:
+        return (
+            date.fromisoformat(start) if start else None,
+            date.fromisoformat(end) if end else None,
+        )
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def write_rows(rows, output_format, out=None):
+    """Write a list of flat dicts as JSON or CSV."""
+    out = out or sys.stdout
+    if output_format == "json":
+        json.dump(rows, out, indent=2, ensure_ascii=False, default=str)
+        out.write("\n")
+        return
+    columns = []
+    for row in rows:
+        columns.extend(column for column in row if column not in columns)
+    writer = csv.DictWriter(out, columns, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def stats(args):
+    from .IncomeAnalysis import IncomeAnalysis
+
+    rows = []
+    for start_date, end_date in args.range or [(None, None)]:
+        analysis = IncomeAnalysis(start_date, end_date, args.patient, args.health_plan)
+        attendances, by_health_plan, income = analysis.calculate_statistics()
+        row = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "patient": args.patient,
+            "health_plan": args.health_plan,
+            "attendances": attendances,
+            "therapist_income": income,
+        }
+        if args.format == "json":
+            row["attendances_by_health_plan"] = by_health_plan
+        else:
+            # One column per health plan
+            row.update(
+                (f"attendances_{plan}", count)
+                for plan, count in by_health_plan.items()
+            )
+        rows.append(row)
+    return rows
+
+
+def series(args):
+    from .IncomeAnalysis import IncomeAnalysis
+
+    analysis = IncomeAnalysis(args.start, args.end, args.patient, args.health_plan)
+    totals = analysis.totals_by_period(args.granularity)
+    return [
+        {
+            "period": period.date(),
+            "attendances": int(row.attendances),
+            "income": float(row.income),
+        }
+        for period, row in totals.iterrows()
+    ]
+
+
+def aggregate(args):
+    from .consolidation import consolidate
+
+    results, combined = consolidate(
+        args.databases,
+        args.start,
+        args.end,
+        args.patient,
+        args.health_plan,
+        args.workers,
+    )
+    rows = []
+    for totals in results + [combined._replace(path="combined")]:
+        row = {
+            "database": totals.path,
+            "attendances": totals.attendances,
+            "therapist_income": totals.therapist_income,
+            "error": totals.error,
+        }
+        if args.format == "json":
+            row["attendances_by_health_plan"] = totals.attendances_by_health_plan
+            row["income_by_health_plan"] = totals.income_by_health_plan
+        else:
+            for plan, count in totals.attendances_by_health_plan.items():
+                row[f"attendances_{plan}"] = count
+                row[f"income_{plan}"] = totals.income_by_health_plan[plan]
+        rows.append(row)
+    # Unreadable databases are reported but do not stop the others
+    return rows, 1 if any(totals.error for totals in results) else 0
+
+
+def export(args):
+    from .change_log import DEFAULT_WATERMARK
+    from .spreadsheet_formats import format_for
+    from .spreadsheet_integration import SpreadsheetIntegration
+
+    integration = SpreadsheetIntegration()
+    if args.changes:
+        patients, appointments = integration.export_changes(
+            args.file, watermark=args.watermark or DEFAULT_WATERMARK
+        )
+    else:
+        patients, appointments = integration.export_to_spreadsheet(
+            args.file, args.watermark
+        )
+    return [
+        {
+            "files": format_for(args.file).dataset_paths(args.file),
+            "patients": patients,
+            "appointments": appointments,
+        }
+    ]
+
+
+def import_(args):
+    from .spreadsheet_integration import SpreadsheetIntegration
+
+    integration = SpreadsheetIntegration()
+    if args.changes:
+        report = integration.import_changes(args.files)
+    else:
+        report = integration.import_files(args.files, args.mode)
+    if args.conflicts:
+        report.write_conflicts(args.conflicts)
+
+    counts = report.counts()
+    row = {"mode": counts["mode"]}
+    for sheet, prefix in (("Pacientes", "patients"), ("Atendimentos", "appointments")):
+        row.update(
+            (f"{prefix}_{outcome}", count) for outcome, count in counts[sheet].items()
+        )
+    row.update(rejected=counts["rejected"], conflicts=counts["conflicts"])
+    return [row]
+
+
+def rebuild(args):
+    from . import income_rollup, patient_search
+    from .models.database import get_engine
+    from .stats_cache import statistics_cache
+
+    with get_engine().begin() as connection:
+        rollup_rows = income_rollup.rebuild(connection)
+        search_index = patient_search.rebuild(connection)
+    statistics_cache.clear()
+    return [{"resumo_diario": rollup_rows, "pacientes_fts": search_index}]
+
+
+def verify(args):
+    from . import income_rollup
+    from .models.database import get_engine
+
+    with get_engine().connect() as connection:
+        differences = income_rollup.verify(connection)
+    rows = [
+        {
+            "day": day,
+            "patient_id": patient_id,
+            "expected": expected,
+            "actual": actual,
+        }
+        for day, patient_id, expected, actual in differences
+    ]
+    return rows, 1 if rows else 0
+
+
+def snapshot_row(snapshot):
+    return {
+        "path": snapshot.path,
+        "created": snapshot.created.isoformat(timespec="seconds"),
+        "size": snapshot.size,
+    }
+
+
+def backup(args):
+    from . import backups
+
+    snapshot = backups.snapshot()
+    expired = backups.rotate(keep=args.keep)
+    return [
+        {**snapshot_row(snapshot), "deleted": [old.path for old in expired]}
+    ]
+
+
+def list_backups(args):
+    from . import backups
+
+    return [snapshot_row(snapshot) for snapshot in backups.list_snapshots()]
+
+
+def restore(args):
+    from . import backups
+
+    safety = backups.restore(args.snapshot)
+    return [
+        {
+            "restored": args.snapshot,
+            "previous_contents": safety.path if safety else None,
+        }
+    ]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument(
+        "--database", help="SQLite file to use instead of the configured one"
+    )
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def filters(command):
+        command.add_argument("--patient", default="All")
+        command.add_argument("--health-plan", default="All")
+
+    command = commands.add_parser("stats", help="statistics per date range")
+    command.add_argument(
+        "--range",
+        type=date_range,
+        action="append",
+        metavar="START:END",
+        help="repeat for several ranges; e.g. 2024-01-01:2024-01-31, 2024-01-01:",
+    )
+    filters(command)
+    command.set_defaults(run=stats)
+
+    command = commands.add_parser("series", help="totals per period")
+    command.add_argument(
+        "--granularity", choices=["day", "week", "month", "year"], default="month"
+    )
+    command.add_argument("--start", type=date.fromisoformat)
+    command.add_argument("--end", type=date.fromisoformat)
+    filters(command)
+    command.set_defaults(run=series)
+
+    command = commands.add_parser(
+        "aggregate", help="statistics consolidated over several databases"
+    )
+    command.add_argument("databases", nargs="+", metavar="DATABASE")
+    command.add_argument("--start", type=date.fromisoformat)
+    command.add_argument("--end", type=date.fromisoformat)
+    command.add_argument(
+        "--workers", type=int, help="worker processes (default: one per core)"
+    )
+    filters(command)
+    command.set_defaults(run=aggregate)
+
+    command = commands.add_parser("export", help="write a backup file")
+    command.add_argument("file", help=".xlsx, .csv.gz, .csv or .parquet")
+    command.add_argument(
+        "--changes", action="store_true", help="only the changes since last backup"
+    )
+    command.add_argument(
+        "--watermark",
+        metavar="NAME",
+        help="backup chain: a full export starts it, --changes continues it "
+        "(default for --changes: backup, the chain of the application)",
+    )
+    command.set_defaults(run=export)
+
+    command = commands.add_parser("import", help="read backup files")
+    command.add_argument("files", nargs="+")
+    command.add_argument("--mode", choices=["skip", "overwrite", "merge"])
+    command.add_argument(
+        "--changes", action="store_true", help="apply an incremental backup"
+    )
+    command.add_argument("--conflicts", help="CSV file for the conflict report")
+    command.set_defaults(run=import_)
+
+    command = commands.add_parser("rebuild", help="regenerate derived data")
+    command.set_defaults(run=rebuild)
+
+    command = commands.add_parser("verify", help="check the daily rollup")
+    command.set_defaults(run=verify)
+
+    command = commands.add_parser("backup", help="take a database snapshot")
+    command.add_argument(
+        "--keep", type=int, help="snapshots to keep (default: [backup] keep)"
+    )
+    command.set_defaults(run=backup)
+
+    command = commands.add_parser("backups", help="list the snapshots")
+    command.set_defaults(run=list_backups)
+
+    command = commands.add_parser(
+        "restore", help="replace the database with a snapshot"
+    )
+    command.add_argument("snapshot")
+    command.set_defaults(run=restore)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.database:
+        # Read when src.models.database is first imported, by the command
+        os.environ["MY_INCOME_PSY_DATABASE_PATH"] = os.path.abspath(args.database)
+
+    try:
+        result = args.run(args)
+    except (OSError, ValueError, sqlite3.Error) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    except Exception as error:
+        # Imported here so commands that never load SQLAlchemy start fast
+        from sqlalchemy.exc import SQLAlchemyError
+
+        if not isinstance(error, SQLAlchemyError):
+            raise
+        # The driver's message, without the statement and the docs link
+        print(f"error: {getattr(error, 'orig', None) or error}", file=sys.stderr)
+        return 1
+
+    status = 0
+    if isinstance(result, tuple):
+        result, status = result
+    write_rows(result, args.format)
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,147 @@
+"""Statistics consolidated over the databases of several clinics.
+
+Each database is queried in its own worker process through a read-only
+connection, with the same aggregation as ``IncomeAnalysis``; the per health
+plan counts and incomes are then summed. Databases not yet opened by a
+version with the daily rollup are aggregated from their appointments. A
+database that cannot be read, e.g. missing, is reported with its error and
+left out of the combined totals instead of failing the whole run::
+
+    python -m src.cli aggregate clinic_a.db clinic_b.db --start 2024-01-01
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+DatabaseTotals = namedtuple(
+    "DatabaseTotals",
+    [
+        "path",
+        "attendances",
+        "attendances_by_health_plan",
+        "income_by_health_plan",
+        "therapist_income",
+        "error",
+    ],
+)
+
+
+def read_only_engine(path):
+    from pathlib import Path
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+
+    # mode=ro fails instead of creating a missing file, and never writes
+    uri = f"{Path(path).resolve().as_uri()}?mode=ro&uri=true"
+    return create_engine(f"sqlite:///{uri}", poolclass=NullPool)
+
+
+def database_totals(path, start_date, end_date, selected_patient, selected_health_plan):
+    """Statistics of one database; runs in a worker process."""
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import SQLAlchemyError
+    from sqlalchemy.orm import Session
+
+    from .IncomeAnalysis import IncomeAnalysis
+
+    analysis = IncomeAnalysis(
+        start_date, end_date, selected_patient, selected_health_plan
+    )
+    engine = read_only_engine(path)
+    try:
+        with Session(engine) as session:
+            if inspect(session.connection()).has_table("resumo_diario"):
+                rows = analysis.statistics_query(session).all()
+            else:
+                # Not opened by a version with the rollup yet, and this
+                # read-only connection cannot create it
+                rows = analysis.appointment_statistics_query(session).all()
+    except SQLAlchemyError as error:
+        message = str(getattr(error, "orig", None) or error)
+        return DatabaseTotals(path, 0, {}, {}, 0.0, message)
+    finally:
+        engine.dispose()
+    return _totals(path, rows)
+
+
+def _totals(path, rows):
+    """Same reduction as ``IncomeAnalysis.calculate_statistics``, by plan."""
+    attendances = 0
+    attendances_by_health_plan = {}
+    income_by_health_plan = {}
+    therapist_income = 0.0
+    for plan, count, patient_count, income in rows:
+        attendances += count
+        therapist_income += income or 0.0
+        if patient_count:
+            attendances_by_health_plan[plan] = patient_count
+            income_by_health_plan[plan] = income or 0.0
+    return DatabaseTotals(
+        path,
+        attendances,
+        attendances_by_health_plan,
+        income_by_health_plan,
+        therapist_income,
+        None,
+    )
+
+
+def combine(results):
+    """Sum the totals of the databases that could be read."""
+    attendances_by_health_plan = {}
+    income_by_health_plan = {}
+    attendances = 0
+    therapist_income = 0.0
+    for result in results:
+        if result.error:
+            continue
+        attendances += result.attendances
+        therapist_income += result.therapist_income
+        for plan, count in result.attendances_by_health_plan.items():
+            attendances_by_health_plan[plan] = (
+                attendances_by_health_plan.get(plan, 0) + count
+            )
+        for plan, income in result.income_by_health_plan.items():
+            income_by_health_plan[plan] = income_by_health_plan.get(plan, 0.0) + income
+    return DatabaseTotals(
+        None,
+        attendances,
+        _by_plan_name(attendances_by_health_plan),
+        _by_plan_name(income_by_health_plan),
+        therapist_income,
+        None,
+    )
+
+
+def _by_plan_name(totals):
+    # Patients without a plan have a NULL health_plan; list them last
+    return dict(
+        sorted(totals.items(), key=lambda item: (item[0] is None, item[0] or ""))
+    )
+
+
+def consolidate(
+    paths,
+    start_date=None,
+    end_date=None,
+    selected_patient="All",
+    selected_health_plan="All",
+    workers=None,
+):
+    """
+    Returns ``(per_database, combined)``: the ``DatabaseTotals`` of each of
+    ``paths``, in order, and their sum. ``workers`` defaults to one process
+    per core; 1 queries the databases one after the other in this process.
+    """
+    arguments = [
+        (path, start_date, end_date, selected_patient, selected_health_plan)
+        for path in paths
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(paths) or 1)
+    if workers == 1:
+        results = [database_totals(*args) for args in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(database_totals, *zip(*arguments)))
+    return results, combine(results)
@@ -0,0 +1,87 @@
+"""Notifications about committed changes to patients and appointments.
+
+ORM writes are recorded by mapper events while the session flushes and are
+published to the subscribers once the transaction commits; a rollback
+discards them. Code that writes through SQLAlchemy Core (bulk imports)
+bypasses the mapper events and calls ``publish_bulk_change`` instead.
+"""
+from collections import namedtuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from .models.models import Appointment, Patient
+
+# model: Patient or Appointment
+# kind: "insert", "update", "delete" or "bulk"
+# old, new: column values before and after the change (None when absent)
+DataChange = namedtuple("DataChange", ["model", "kind", "old", "new"])
+
+_subscribers = []
+_PENDING_KEY = "pending_data_changes"
+
+
+def subscribe(callback):
+    """Call ``callback(changes)`` with the list of changes of every commit."""
+    _subscribers.append(callback)
+    return callback
+
+
+def unsubscribe(callback):
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+
+def publish(changes):
+    for callback in list(_subscribers):
+        callback(changes)
+
+
+def publish_bulk_change(*models):
+    """Signal that rows of ``models`` changed without going through the ORM."""
+    publish([DataChange(model, "bulk", None, None) for model in models])
+
+
+def _values(target, before):
+    state = inspect(target)
+    values = {}
+    for column in state.mapper.column_attrs:
+        history = state.attrs[column.key].history
+        if before and history.deleted:
+            values[column.key] = history.deleted[0]
+        elif before and history.added:
+            values[column.key] = None
+        else:
+            values[column.key] = getattr(target, column.key)
+    return values
+
+
+def _record(kind):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if session is None:
+            return
+        old = _values(target, before=True) if kind != "insert" else None
+        new = _values(target, before=False) if kind != "delete" else None
+        session.info.setdefault(_PENDING_KEY, []).append(
+            DataChange(mapper.class_, kind, old, new)
+        )
+
+    return listener
+
+
+for _model in (Patient, Appointment):
+    for _kind in ("insert", "update", "delete"):
+        event.listen(_model, f"after_{_kind}", _record(_kind))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if changes:
+        publish(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,172 @@
+"""Background execution of database jobs for the Tk views.
+
+Views submit jobs instead of querying on the Tk thread. Reads run on a small
+pool of reader threads, writes on a single writer thread so they never
+compete with each other for the SQLite lock. Every job runs inside its own
+``session_scope``, so it commits on success and rolls back on error exactly as
+before. Results are handed back on the Tk thread by polling with
+``widget.after``; jobs must therefore return plain data (rows, tuples,
+DataFrames), not ORM objects bound to the closed session.
+
+Jobs submitted with the same ``key`` supersede each other: an older job that
+has not started is cancelled, and the result of one already running is
+dropped, e.g. the search for an earlier keystroke.
+"""
+import logging
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import instrumentation
+from .settings import get_setting
+from .utils import session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseExecutor:
+    # How often the Tk thread looks for finished jobs while some are pending
+    POLL_MS = 15
+
+    def __init__(self, readers=2):
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="db-writer"
+        )
+        self._readers = ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="db-reader"
+        )
+        self._results = queue.SimpleQueue()
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._polling = False
+
+    def submit(
+        self,
+        job,
+        *args,
+        widget,
+        on_success=None,
+        on_error=None,
+        key=None,
+        write=False,
+        session=True,
+    ):
+        """
+        Runs ``job(session, *args)`` on a worker thread and then calls
+        ``on_success(result)`` or ``on_error(exception)`` on the Tk thread.
+        Callbacks are skipped if ``widget`` was destroyed in the meantime.
+        Jobs that open their own sessions pass ``session=False`` and are
+        called as ``job(*args)``. Must be called from the Tk thread.
+        """
+        token = object()
+        pool = self._writer if write else self._readers
+        # Counted against the UI action that submitted it, if recorded
+        action = instrumentation.current_action()
+        instrumentation.job_submitted(action)
+        future = pool.submit(self._run, job, args, action, session)
+
+        if key is not None:
+            with self._lock:
+                previous = self._latest.get(key)
+                self._latest[key] = (token, future)
+            if previous is not None:
+                previous[1].cancel()
+
+        self._pending += 1
+        future.add_done_callback(
+            lambda done: self._results.put(
+                (done, widget, on_success, on_error, key, token, action)
+            )
+        )
+        self._schedule_poll(widget)
+        return future
+
+    def submit_background(self, job, *args):
+        """
+        Runs ``job(session, *args)`` on a reader thread for its side effects
+        only: nothing is handed back to Tk, and errors are logged. Unlike
+        ``submit`` it may be called from any thread, e.g. a data_events
+        subscriber.
+        """
+        future = self._readers.submit(self._run, job, args, None, True)
+        future.add_done_callback(self._log_background_error)
+        return future
+
+    @staticmethod
+    def _log_background_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(
+                "Background database job failed", exc_info=future.exception()
+            )
+
+    def cancel(self, key):
+        """Forget the job submitted with ``key``, cancelling it if not started."""
+        with self._lock:
+            latest = self._latest.pop(key, None)
+        if latest is not None:
+            latest[1].cancel()
+
+    def shutdown(self):
+        self._readers.shutdown(wait=False, cancel_futures=True)
+        self._writer.shutdown(wait=True)
+
+    @staticmethod
+    def _run(job, args, action, with_session):
+        with instrumentation.running(action):
+            if not with_session:
+                return job(*args)
+            with session_scope() as session:
+                return job(session, *args)
+
+    def _schedule_poll(self, widget):
+        if not self._polling:
+            self._polling = True
+            root = widget._root()
+            root.after(self.POLL_MS, self._poll, root)
+
+    def _poll(self, root):
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            *delivery, action = result
+            try:
+                # Jobs submitted by the callbacks belong to the same action
+                with instrumentation.running(action):
+                    self._deliver(*delivery)
+            except Exception:
+                # Keep polling for the other jobs after a failing callback
+                root.report_callback_exception(*sys.exc_info())
+            finally:
+                instrumentation.job_delivered(action)
+
+        if self._pending:
+            root.after(self.POLL_MS, self._poll, root)
+        else:
+            self._polling = False
+
+    def _deliver(self, future, widget, on_success, on_error, key, token):
+        if key is not None:
+            with self._lock:
+                latest = self._latest.get(key)
+                if latest is None or latest[0] is not token:
+                    return  # Superseded by a newer job
+                del self._latest[key]
+        if future.cancelled() or not widget.winfo_exists():
+            return
+
+        error = future.exception()
+        if error is None:
+            if on_success is not None:
+                on_success(future.result())
+        elif on_error is not None:
+            on_error(error)
+        else:
+            raise error
+
+
+db_executor = DatabaseExecutor(readers=int(get_setting("worker", "readers", 2)))
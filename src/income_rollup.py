@@ -0,0 +1,177 @@
+"""Maintenance of the ``resumo_diario`` rollup table.
+
+The table holds one row per (day, patient) with the number of appointments
+and the therapist income, denormalizing the patient's health plan.
+Appointments without a patient (the patient was deleted) are kept under
+``patient_id`` 0 so they still count towards the totals. SQLite
+triggers keep it in sync with ``atendimentos`` and ``pacientes``; this module
+installs them, and can rebuild the table from scratch or check it::
+
+    python -m src.income_rollup verify
+    python -m src.income_rollup rebuild
+"""
+from sqlalchemy import event, text
+
+from .models.models import Base, IncomeRollup
+
+# Therapist income of one appointment of patient ``p``
+_RATE = "COALESCE(p.clinic_value * (p.therapist_percentage / 100.0), 0.0)"
+
+
+def _add_appointment(row):
+    return f"""
+        INSERT INTO resumo_diario
+            (day, patient_id, health_plan, appointment_count, therapist_income)
+        SELECT {row}.date, COALESCE({row}.patient_id, 0), p.health_plan, 1, {_RATE}
+        FROM (SELECT 1) LEFT JOIN pacientes p ON p.id = {row}.patient_id
+        WHERE {row}.date IS NOT NULL
+        ON CONFLICT (day, patient_id) DO UPDATE SET
+            appointment_count = appointment_count + 1,
+            therapist_income = therapist_income + excluded.therapist_income;"""
+
+
+def _remove_appointment(row):
+    return f"""
+        UPDATE resumo_diario SET
+            appointment_count = appointment_count - 1,
+            therapist_income = therapist_income - COALESCE(
+                (SELECT {_RATE} FROM pacientes p WHERE p.id = {row}.patient_id),
+                0.0
+            )
+        WHERE day = {row}.date AND patient_id = COALESCE({row}.patient_id, 0);
+        DELETE FROM resumo_diario
+        WHERE day = {row}.date AND patient_id = COALESCE({row}.patient_id, 0)
+            AND appointment_count <= 0;"""
+
+
+def _reprice_patient(row):
+    return f"""
+        UPDATE resumo_diario SET
+            health_plan = {row}.health_plan,
+            therapist_income = appointment_count * COALESCE(
+                {row}.clinic_value * ({row}.therapist_percentage / 100.0), 0.0
+            )
+        WHERE patient_id = {row}.id;"""
+
+
+TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_atendimento_insert
+    AFTER INSERT ON atendimentos
+    BEGIN{_add_appointment("NEW")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_atendimento_delete
+    AFTER DELETE ON atendimentos
+    BEGIN{_remove_appointment("OLD")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_atendimento_update
+    AFTER UPDATE OF date, patient_id ON atendimentos
+    WHEN OLD.date IS NOT NEW.date OR OLD.patient_id IS NOT NEW.patient_id
+    BEGIN{_remove_appointment("OLD")}{_add_appointment("NEW")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_paciente_insert
+    AFTER INSERT ON pacientes
+    BEGIN{_reprice_patient("NEW")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resumo_diario_paciente_update
+    AFTER UPDATE OF health_plan, clinic_value, therapist_percentage ON pacientes
+    BEGIN{_reprice_patient("NEW")}
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS resumo_diario_paciente_delete
+    AFTER DELETE ON pacientes
+    BEGIN
+        UPDATE resumo_diario SET health_plan = NULL, therapist_income = 0.0
+        WHERE patient_id = OLD.id;
+    END""",
+]
+
+# The rollup as computed directly from the appointments
+EXPECTED_ROWS = f"""
+    SELECT a.date AS day, COALESCE(a.patient_id, 0) AS patient_id, p.health_plan,
+        COUNT(*) AS appointment_count,
+        COUNT(*) * {_RATE} AS therapist_income
+    FROM atendimentos a LEFT JOIN pacientes p ON p.id = a.patient_id
+    WHERE a.date IS NOT NULL
+    GROUP BY a.date, COALESCE(a.patient_id, 0)
+"""
+
+
+def install_triggers(connection):
+    for trigger in TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+
+def rebuild(connection):
+    """Regenerate the rollup from ``atendimentos``. Returns the row count."""
+    connection.exec_driver_sql("DELETE FROM resumo_diario")
+    connection.exec_driver_sql(
+        "INSERT INTO resumo_diario "
+        "(day, patient_id, health_plan, appointment_count, therapist_income) "
+        + EXPECTED_ROWS
+    )
+    return connection.execute(text("SELECT COUNT(*) FROM resumo_diario")).scalar()
+
+
+def verify(connection, tolerance=1e-6):
+    """
+    Compares the rollup with the appointments.
+
+    Returns a list of ``(day, patient_id, expected, actual)`` tuples, where
+    ``expected`` and ``actual`` are ``(health_plan, count, income)`` or
+    ``None`` when the row is missing. An empty list means the rollup is exact.
+    """
+    expected = {
+        (row.day, row.patient_id): (
+            row.health_plan, row.appointment_count, row.therapist_income
+        )
+        for row in connection.exec_driver_sql(EXPECTED_ROWS)
+    }
+    actual = {
+        (row.day, row.patient_id): (
+            row.health_plan, row.appointment_count, row.therapist_income
+        )
+        for row in connection.exec_driver_sql(
+            "SELECT day, patient_id, health_plan, appointment_count, "
+            "therapist_income FROM resumo_diario"
+        )
+    }
+
+    differences = []
+    for key in sorted(expected.keys() | actual.keys(), key=str):
+        wanted, found = expected.get(key), actual.get(key)
+        if (
+            wanted is None
+            or found is None
+            or wanted[:2] != found[:2]
+            or abs(wanted[2] - found[2]) > tolerance
+        ):
+            differences.append((*key, wanted, found))
+    return differences
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _populate_new_rollup(target, connection, tables=(), **kw):
+    # Runs once every table exists, since the triggers reference all of them
+    if IncomeRollup.__table__ in tables:
+        install_triggers(connection)
+        rebuild(connection)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .models.database import engine
+
+    parser = argparse.ArgumentParser(description="Maintain the resumo_diario rollup")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        if args.command == "rebuild":
+            print(f"Rebuilt resumo_diario with {rebuild(connection)} rows")
+            raise SystemExit(0)
+        differences = verify(connection)
+
+    for day, patient_id, expected, actual in differences:
+        print(f"{day} patient {patient_id}: expected {expected}, found {actual}")
+    print(f"{len(differences)} differences")
+    raise SystemExit(1 if differences else 0)
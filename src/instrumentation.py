@@ -0,0 +1,295 @@
+"""Per UI action cost: SQL statements, SQL time, sessions and wall time.
+
+A UI action starts when a method decorated with ``ui_action`` (or a block in
+``action``) runs on the Tk thread, and ends once every database job it
+submitted, and those submitted by their callbacks, has been delivered back.
+``db_worker`` carries the current action to its threads, so the statements
+a job runs are counted against the click that caused it.
+
+Recording is off unless enabled with the setting::
+
+    [instrumentation]
+    enabled = true
+    # Actions slower than this are logged as warnings and shown in red
+    slow_ms = 250
+
+or at run time with ``enable()``, e.g. by opening the debug overlay (F12).
+The finished actions can be saved as a JSON or CSV trace.
+"""
+import csv
+import functools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from .settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Finished actions kept for the overlay and the traces
+MAX_ACTIONS = 500
+# Statements kept per action; the counters include the ones dropped
+MAX_QUERIES_PER_ACTION = 100
+
+TRUE_SETTINGS = ("1", "true", "yes", "on")
+
+_current = ContextVar("instrumentation_action", default=None)
+
+
+class Action:
+    """Counters of one UI action, updated from the Tk and worker threads."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.wall_ms = None
+        self.handler_ms = None
+        self.query_count = 0
+        self.sql_ms = 0.0
+        self.session_count = 0
+        self.session_ms = 0.0
+        self.jobs = 0
+        self.queries = []
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.wall_ms is not None
+
+    def add_query(self, statement, elapsed_ms):
+        with self._lock:
+            self.query_count += 1
+            self.sql_ms += elapsed_ms
+            if len(self.queries) < MAX_QUERIES_PER_ACTION:
+                self.queries.append((statement, elapsed_ms))
+
+    def add_session(self, elapsed_ms):
+        with self._lock:
+            self.session_count += 1
+            self.session_ms += elapsed_ms
+
+    def as_dict(self, queries=True):
+        values = {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "wall_ms": self.wall_ms,
+            "handler_ms": self.handler_ms,
+            "jobs": self.jobs,
+            "query_count": self.query_count,
+            "sql_ms": self.sql_ms,
+            "session_count": self.session_count,
+            "session_ms": self.session_ms,
+            "slow": recorder.is_slow(self),
+        }
+        if queries:
+            values["queries"] = [
+                {"statement": statement, "ms": elapsed_ms}
+                for statement, elapsed_ms in self.queries
+            ]
+        return values
+
+
+class Recorder:
+    """Finished actions, newest last, and the listeners told about them."""
+
+    CSV_COLUMNS = [
+        "name",
+        "started_at",
+        "wall_ms",
+        "handler_ms",
+        "jobs",
+        "query_count",
+        "sql_ms",
+        "session_count",
+        "session_ms",
+        "slow",
+    ]
+
+    def __init__(self, slow_ms=250.0):
+        self.enabled = False
+        self.slow_ms = slow_ms
+        self.actions = deque(maxlen=MAX_ACTIONS)
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def is_slow(self, action):
+        return action.wall_ms is not None and action.wall_ms > self.slow_ms
+
+    def finish(self, action):
+        action.wall_ms = (time.perf_counter() - action.start) * 1000
+        with self._lock:
+            self.actions.append(action)
+            listeners = list(self.listeners)
+        if self.is_slow(action):
+            logger.warning(
+                "Slow action %s: %.0f ms, %d queries, %.0f ms of SQL",
+                action.name,
+                action.wall_ms,
+                action.query_count,
+                action.sql_ms,
+            )
+        for listener in listeners:
+            listener(action)
+
+    def finished_actions(self):
+        with self._lock:
+            return list(self.actions)
+
+    def clear(self):
+        with self._lock:
+            self.actions.clear()
+
+    def write_json(self, file_path):
+        trace = {
+            "slow_ms": self.slow_ms,
+            "actions": [action.as_dict() for action in self.finished_actions()],
+        }
+        with open(file_path, "w", encoding="utf-8") as trace_file:
+            json.dump(trace, trace_file, indent=2)
+
+    def write_csv(self, file_path):
+        """One row per action, without the statements."""
+        with open(file_path, "w", newline="", encoding="utf-8") as trace_file:
+            writer = csv.DictWriter(trace_file, self.CSV_COLUMNS)
+            writer.writeheader()
+            for action in self.finished_actions():
+                writer.writerow(action.as_dict(queries=False))
+
+
+recorder = Recorder(float(get_setting("instrumentation", "slow_ms", 250)))
+
+
+def enable():
+    """Start recording; the SQL hooks are installed on first use."""
+    _install_sql_hooks()
+    recorder.enabled = True
+
+
+def disable():
+    recorder.enabled = False
+
+
+def current_action():
+    return _current.get()
+
+
+@contextmanager
+def action(name):
+    """
+    Record the block as a UI action, unless it runs inside another one,
+    which then includes it. Must run on the Tk thread.
+    """
+    if not recorder.enabled or _current.get() is not None:
+        yield _current.get()
+        return
+
+    new_action = Action(name)
+    token = _current.set(new_action)
+    try:
+        yield new_action
+    finally:
+        _current.reset(token)
+        new_action.handler_ms = (time.perf_counter() - new_action.start) * 1000
+        with new_action._lock:
+            done = new_action._pending == 0
+        if done:
+            recorder.finish(new_action)
+
+
+def ui_action(method):
+    """Record each call of a view method as a UI action named after it."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with action(f"{type(self).__name__}.{method.__name__}"):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def job_submitted(job_action):
+    if job_action is not None:
+        with job_action._lock:
+            job_action._pending += 1
+            job_action.jobs += 1
+
+
+def job_delivered(job_action):
+    """Called on the Tk thread once a job's callbacks ran or were skipped."""
+    if job_action is None:
+        return
+    with job_action._lock:
+        job_action._pending -= 1
+        done = job_action._pending == 0 and job_action.handler_ms is not None
+    if done and not job_action.finished:
+        recorder.finish(job_action)
+
+
+@contextmanager
+def running(job_action):
+    """Attribute the work done in the block, on any thread, to ``job_action``."""
+    if job_action is None:
+        yield
+        return
+    token = _current.set(job_action)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed_session():
+    """Time a ``session_scope`` block for the current action."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add_session((time.perf_counter() - start) * 1000)
+
+
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+def _install_sql_hooks():
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        # Listening on the class covers engines created later too
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _hooks_installed = True
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("instrumentation_starts", []).append(
+            time.perf_counter()
+        )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _current.get()
+    starts = conn.info.get("instrumentation_starts")
+    if current is not None and starts:
+        current.add_query(statement, (time.perf_counter() - starts.pop()) * 1000)
+
+
+if get_setting("instrumentation", "enabled", "false").lower() in TRUE_SETTINGS:
+    enable()
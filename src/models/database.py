@@ -1,27 +1,125 @@
 import os
-import sys
-from sqlalchemy import create_engine
+import threading
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+
+from .. import change_log, income_rollup, patient_search  # noqa: F401  (install triggers)
+from ..settings import basedir, get_section, get_setting
 from .models import Base  # Import the Base
 
-# Modified DATABASE_URL to handle bundled environment
-if getattr(sys, 'frozen', False):
-    # we are running in a bundle
-    basedir = os.path.dirname(sys.executable)
-else:
-    # we are running in a normal Python environment
-    basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+DATABASE_PATH = get_setting(
+    "database", "path", os.path.join(basedir, 'psychology.db')
+)
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+
+# Named sets of PRAGMAs applied to every new SQLite connection.
+# "safe" keeps SQLite's defaults: rollback journal and a full fsync per commit.
+# "balanced" uses WAL, so readers do not block while a session is being saved,
+# and only syncs at checkpoints. "fast" also skips syncing entirely, which
+# may lose the last transactions on a power failure.
+PERFORMANCE_PROFILES = {
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,  # negative values are KiB
+        "temp_store": "MEMORY",
+        "mmap_size": 64 * 1024 * 1024,
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -64000,
+        "temp_store": "MEMORY",
+        "mmap_size": 256 * 1024 * 1024,
+    },
+}
+DEFAULT_PROFILE = "balanced"
+PRAGMA_NAMES = ("journal_mode", "synchronous", "cache_size", "temp_store", "mmap_size")
+
+
+def get_performance_profile(name=None):
+    """Return the PRAGMAs for a profile.
+
+    Without a name, the profile comes from the ``[database] profile`` setting.
+    Individual PRAGMAs set in the ``[database]`` section override the profile.
+    """
+    settings = get_section("database")
+    name = name or settings.get("profile", DEFAULT_PROFILE)
+    if name not in PERFORMANCE_PROFILES:
+        raise ValueError(
+            f"Unknown database profile '{name}'. "
+            f"Choose one of: {', '.join(PERFORMANCE_PROFILES)}"
+        )
+    pragmas = dict(PERFORMANCE_PROFILES[name])
+    for pragma in PRAGMA_NAMES:
+        if pragma in settings:
+            pragmas[pragma] = settings[pragma]
+    return pragmas
+
+
+def create_db_engine(url=DATABASE_URL, profile=None):
+    """Create an engine that applies a performance profile to each connection."""
+    engine = create_engine(url)
+    pragmas = get_performance_profile(profile)
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    return engine
+
+
+# The engine is only created, and the schema checked, when the first session
+# is opened, so importing the models does not touch the database file
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the application engine, creating it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_db_engine()
+            init_db(_engine)
+            if SessionLocal.kw.get("bind") is None:
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def __getattr__(name):
+    # ``database.engine`` keeps working for scripts that import it
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-DATABASE_URL = f"sqlite:///{os.path.join(basedir, 'psychology.db')}"
+def init_db(bind=None):
+    """Create missing tables and indexes.
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    ``create_all`` skips tables that already exist, so indexes added to the
+    models after a database was created are created here one by one.
+    """
+    bind = bind if bind is not None else get_engine()
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
 
-# def criar_banco():
-if not os.path.exists(os.path.join(basedir, 'psychology.db')):
-    Base.metadata.create_all(bind=engine)
 
 def get_session():
+    if SessionLocal.kw.get("bind") is None:
+        get_engine()
     db = SessionLocal()
     try:
         yield db
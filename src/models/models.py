@@ -7,6 +7,7 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
 )
@@ -44,10 +45,10 @@ class Patient(Base):
     __tablename__ = "pacientes"
 
     id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, index=True)
     attendance_day = Column(Enum(WeekDays))
     time = Column(String)
-    health_plan = Column(String, nullable=True)
+    health_plan = Column(String, nullable=True, index=True)
     clinic_value = Column(Float)
     therapist_percentage = Column(Float)
 
@@ -56,6 +57,11 @@ class Patient(Base):
 
 class Appointment(Base):
     __tablename__ = "atendimentos"
+    __table_args__ = (
+        # Date ranges (statistics, session list) and per-patient lookups
+        Index("ix_atendimentos_date_patient_id", "date", "patient_id"),
+        Index("ix_atendimentos_patient_id_date", "patient_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True)
     date = Column(Date)
@@ -64,3 +70,49 @@ class Appointment(Base):
     record_launched = Column(Boolean, default=False)
 
     patient = relationship("Patient", back_populates="appointments")
+
+
+class IncomeRollup(Base):
+    """Appointment count and therapist income per day and patient.
+
+    Kept up to date by SQLite triggers on ``atendimentos`` and ``pacientes``
+    (see ``src/income_rollup.py``), so statistics read a few rows per day
+    instead of every appointment.
+    """
+
+    __tablename__ = "resumo_diario"  # Keep the table name in Portuguese
+    __table_args__ = (
+        Index("ix_resumo_diario_patient_id_day", "patient_id", "day"),
+    )
+
+    day = Column(Date, primary_key=True)
+    patient_id = Column(Integer, primary_key=True)
+    health_plan = Column(String, nullable=True)
+    appointment_count = Column(Integer, nullable=False, default=0)
+    therapist_income = Column(Float, nullable=False, default=0.0)
+
+
+class ChangeLog(Base):
+    """Rows of ``pacientes`` and ``atendimentos`` inserted, updated or deleted.
+
+    Filled by SQLite triggers (see ``src/change_log.py``) and read by the
+    incremental export, which writes the rows changed after a watermark.
+    """
+
+    __tablename__ = "alteracoes"  # Keep the table name in Portuguese
+    # AUTOINCREMENT: sequence numbers are never reused after pruning
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+    seq = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    operation = Column(String(1), nullable=False)  # "I", "U" or "D"
+
+
+class ExportWatermark(Base):
+    """Last ``ChangeLog.seq`` included in an export."""
+
+    __tablename__ = "marcas_exportacao"  # Keep the table name in Portuguese
+
+    name = Column(String, primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,153 @@
+"""In-memory directory of patients for autocomplete and name lookups.
+
+The id, name and health plan of every patient are loaded once, with a sorted
+prefix index and an n-gram index for substring searches, so each keystroke is
+answered without touching SQLite. Matching ignores case and accents.
+
+Loading queries the database, so it never happens on the Tk thread: views
+call ``load()`` in a ``db_executor`` job, and the lookups only read the
+last loaded snapshot. Once loaded, the directory is marked stale after any
+committed change to the patients and reloaded by a background
+``db_executor`` job; until then lookups answer from the previous snapshot.
+"""
+import bisect
+import threading
+import unicodedata
+from collections import defaultdict, namedtuple
+
+from . import data_events
+from .db_worker import db_executor
+from .models.models import Patient
+from .utils import session_scope
+
+PatientEntry = namedtuple("PatientEntry", ["id", "name", "health_plan"])
+
+NGRAM_SIZE = 3
+
+
+def normalize(text):
+    """Lowercase ``text`` and strip its accents ("José" -> "jose")."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def _ngrams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+_Snapshot = namedtuple("_Snapshot", ["entries", "keys", "by_name", "ngrams"])
+
+
+class PatientDirectory:
+    def __init__(self):
+        # Serializes the loads; lookups never wait for it
+        self._load_lock = threading.Lock()
+        self._stale = True
+        self._loaded = False
+        # Replaced as a whole, so a lookup never sees half a rebuild
+        self._snapshot = _Snapshot([], [], {}, {})
+
+    def invalidate(self):
+        self._stale = True
+
+    def load(self, session=None):
+        """
+        Load the patients if the directory is stale. Queries the database,
+        so call it off the Tk thread, e.g. from a ``db_executor`` job with
+        its session.
+        """
+        with self._load_lock:
+            if not self._stale:
+                return
+            # A change committed while reading marks it stale again
+            self._stale = False
+            if session is None:
+                with session_scope() as session:
+                    rows = self._query(session)
+            else:
+                rows = self._query(session)
+            self._snapshot = self._build([PatientEntry(*row) for row in rows])
+            self._loaded = True
+
+    @staticmethod
+    def _query(session):
+        return session.query(Patient.id, Patient.name, Patient.health_plan).all()
+
+    @staticmethod
+    def _build(entries):
+        entries.sort(key=lambda entry: (normalize(entry.name), entry.id))
+        keys = [normalize(entry.name) for entry in entries]
+
+        by_name = {}
+        ngrams = defaultdict(set)
+        for position, (entry, key) in enumerate(zip(entries, keys)):
+            # Lowest id first, as the previous ``.first()`` lookups returned
+            by_name.setdefault(entry.name, entry)
+            for size in range(1, NGRAM_SIZE + 1):
+                for gram in _ngrams(key, size):
+                    ngrams[gram].add(position)
+        return _Snapshot(entries, keys, by_name, dict(ngrams))
+
+    def entries(self):
+        """All patients ordered by name."""
+        return list(self._snapshot.entries)
+
+    def names(self):
+        """All patient names ordered alphabetically."""
+        return [entry.name for entry in self._snapshot.entries]
+
+    def health_plans(self):
+        """Distinct non-empty health plans ordered alphabetically."""
+        return sorted(
+            {
+                entry.health_plan
+                for entry in self._snapshot.entries
+                if entry.health_plan
+            }
+        )
+
+    def find_by_name(self, name):
+        """The patient with exactly this name, or None."""
+        return self._snapshot.by_name.get(name)
+
+    def starting_with(self, prefix):
+        """Names starting with ``prefix``, ordered alphabetically."""
+        snapshot = self._snapshot
+        prefix = normalize(prefix)
+        start = bisect.bisect_left(snapshot.keys, prefix)
+        end = bisect.bisect_left(snapshot.keys, prefix + "\U0010ffff")
+        return [entry.name for entry in snapshot.entries[start:end]]
+
+    def search(self, text):
+        """Names containing ``text``, ordered alphabetically."""
+        snapshot = self._snapshot
+        text = normalize(text)
+        if not text:
+            return [entry.name for entry in snapshot.entries]
+
+        if len(text) <= NGRAM_SIZE:
+            positions = snapshot.ngrams.get(text, set())
+        else:
+            grams = sorted(
+                _ngrams(text, NGRAM_SIZE),
+                key=lambda gram: len(snapshot.ngrams.get(gram, ())),
+            )
+            positions = set(snapshot.ngrams.get(grams[0], ()))
+            for gram in grams[1:]:
+                positions &= snapshot.ngrams.get(gram, set())
+                if not positions:
+                    break
+            # The n-grams can all match without the text being contiguous
+            positions = {p for p in positions if text in snapshot.keys[p]}
+        return [snapshot.entries[position].name for position in sorted(positions)]
+
+    def on_data_changes(self, changes):
+        if any(change.model is Patient for change in changes):
+            self.invalidate()
+            if self._loaded:
+                # Called from another session's commit; read in a job of its own
+                db_executor.submit_background(self.load)
+
+
+patient_directory = PatientDirectory()
+data_events.subscribe(patient_directory.on_data_changes)
@@ -0,0 +1,134 @@
+"""Full-text patient search backed by an SQLite FTS5 index.
+
+``pacientes_fts`` is an external-content FTS5 table over the name and health
+plan of ``pacientes``, kept in sync by triggers. The ``unicode61`` tokenizer
+with ``remove_diacritics`` makes searches accent-insensitive, so "joao"
+finds "João". FTS5 only matches the start of words, so the names containing
+the text elsewhere, e.g. "ria" in "Maria", are found with a ``LIKE`` and
+listed after the ranked matches. If the SQLite build lacks FTS5 the search
+only uses the ``LIKE``.
+"""
+import re
+
+from sqlalchemy import column, event, literal_column, or_, select, table, text
+from sqlalchemy.exc import OperationalError
+
+from .models.models import Base, Patient
+
+FTS_TABLE = """CREATE VIRTUAL TABLE IF NOT EXISTS pacientes_fts USING fts5(
+    name,
+    health_plan,
+    content='pacientes',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)"""
+
+TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS pacientes_fts_insert AFTER INSERT ON pacientes
+    BEGIN
+        INSERT INTO pacientes_fts (rowid, name, health_plan)
+        VALUES (NEW.id, NEW.name, NEW.health_plan);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pacientes_fts_delete AFTER DELETE ON pacientes
+    BEGIN
+        INSERT INTO pacientes_fts (pacientes_fts, rowid, name, health_plan)
+        VALUES ('delete', OLD.id, OLD.name, OLD.health_plan);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pacientes_fts_update
+    AFTER UPDATE OF id, name, health_plan ON pacientes
+    BEGIN
+        INSERT INTO pacientes_fts (pacientes_fts, rowid, name, health_plan)
+        VALUES ('delete', OLD.id, OLD.name, OLD.health_plan);
+        INSERT INTO pacientes_fts (rowid, name, health_plan)
+        VALUES (NEW.id, NEW.name, NEW.health_plan);
+    END""",
+]
+
+# Name matches weigh more than health plan matches in the ranking
+RANK = "bm25(pacientes_fts, 10.0, 1.0)"
+
+pacientes_fts = table("pacientes_fts", column("rowid"))
+
+
+def fts_available(connection):
+    return (
+        connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'pacientes_fts'"
+        ).first()
+        is not None
+    )
+
+
+def install(connection):
+    """Create and fill the FTS index if it does not exist yet."""
+    if fts_available(connection):
+        return
+    try:
+        connection.exec_driver_sql(FTS_TABLE)
+    except OperationalError:
+        return  # SQLite without FTS5, searches use LIKE
+    for trigger in TRIGGERS:
+        connection.exec_driver_sql(trigger)
+    connection.exec_driver_sql(
+        "INSERT INTO pacientes_fts (pacientes_fts) VALUES ('rebuild')"
+    )
+
+
+def rebuild(connection):
+    """Refill the FTS index from ``pacientes``. Returns False without FTS5."""
+    if not fts_available(connection):
+        install(connection)
+        return fts_available(connection)
+    connection.exec_driver_sql(
+        "INSERT INTO pacientes_fts (pacientes_fts) VALUES ('rebuild')"
+    )
+    return True
+
+
+def match_expression(search_text):
+    """
+    Turns what the user typed into an FTS5 query matching every word as a
+    prefix, e.g. 'mar sil' -> '"mar"* "sil"*'. Returns None for blank text.
+    """
+    words = re.findall(r"\w+", search_text or "")
+    if not words:
+        return None
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def search_patients(session, search_text):
+    """
+    Returns a query of the patients matching ``search_text`` in their name or
+    health plan, best matches first, followed by the other patients whose
+    name contains the text, by name. Blank text returns every patient by
+    name.
+    """
+    query = session.query(Patient)
+    expression = match_expression(search_text)
+    if expression is None:
+        return query.order_by(Patient.name)
+
+    contains_text = Patient.name.ilike(f"%{search_text}%")
+    if not fts_available(session.connection()):
+        return query.filter(contains_text).order_by(Patient.name)
+
+    word_matches = (
+        select(pacientes_fts.c.rowid, literal_column(RANK).label("rank"))
+        .where(
+            text("pacientes_fts MATCH :expression").bindparams(
+                expression=expression
+            )
+        )
+        .subquery()
+    )
+    return (
+        query.outerjoin(word_matches, word_matches.c.rowid == Patient.id)
+        .filter(or_(word_matches.c.rowid.isnot(None), contains_text))
+        # Ranked word matches, then the names containing the text elsewhere
+        .order_by(word_matches.c.rowid.is_(None), word_matches.c.rank, Patient.name)
+    )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_fts(target, connection, **kw):
+    install(connection)
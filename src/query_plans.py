@@ -0,0 +1,89 @@
+"""Checks that the hot queries of the application are served by indexes.
+
+Run against the application database with::
+
+    python -m src.query_plans
+"""
+from datetime import date
+
+from .IncomeAnalysis import IncomeAnalysis
+from .models.models import Appointment, Patient
+
+
+def hot_queries(session):
+    """Return ``(name, query)`` pairs mirroring the queries issued by the views."""
+    start_date, end_date = date(2024, 1, 1), date(2024, 1, 31)
+
+    return [
+        (
+            "statistics_by_date",
+            IncomeAnalysis(start_date, end_date).statistics_query(session),
+        ),
+        (
+            "statistics_by_patient",
+            IncomeAnalysis(start_date, end_date, "Maria").statistics_query(session),
+        ),
+        (
+            "statistics_by_health_plan",
+            IncomeAnalysis(
+                start_date, end_date, selected_health_plan="UNIMED"
+            ).statistics_query(session),
+        ),
+        (
+            "patient_by_name",
+            session.query(Patient).filter(Patient.name == "Maria"),
+        ),
+        (
+            "patients_by_name_order",
+            session.query(Patient).order_by(Patient.name),
+        ),
+        (
+            "health_plans",
+            session.query(Patient.health_plan).distinct(),
+        ),
+        (
+            "latest_sessions",
+            session.query(Appointment).order_by(Appointment.date.desc()).limit(15),
+        ),
+    ]
+
+
+def explain_query_plan(session, query):
+    """Return the ``EXPLAIN QUERY PLAN`` detail lines for a query."""
+    compiled = query.statement.compile(dialect=session.bind.dialect)
+    # The plan does not depend on the bound values, only on their positions
+    params = tuple(None for _ in compiled.positiontup or ())
+    rows = session.connection().exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {compiled}", params
+    )
+    return [row[-1] for row in rows]
+
+
+def uses_index(plan):
+    """True when no step of the plan is a full scan of a table."""
+    for step in plan:
+        if step.startswith("SCAN") and "INDEX" not in step:
+            return False
+    return True
+
+
+def check_query_plans(session):
+    """Return ``(name, plan, uses_index)`` for every hot query."""
+    results = []
+    for name, query in hot_queries(session):
+        plan = explain_query_plan(session, query)
+        results.append((name, plan, uses_index(plan)))
+    return results
+
+
+if __name__ == "__main__":
+    from .utils import session_scope
+
+    with session_scope() as session:
+        failures = 0
+        for name, plan, ok in check_query_plans(session):
+            print(f"{'OK  ' if ok else 'SCAN'} {name}")
+            for step in plan:
+                print(f"       {step}")
+            failures += not ok
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,211 @@
+"""Read models for the list and report screens.
+
+Each function issues one query projecting only the columns the screen shows,
+joined with the patient name where needed, and returns lightweight
+namedtuples instead of ORM objects. No row triggers a lazy load, so the
+number of statements per refresh stays constant however many rows are
+shown. Check it with::
+
+    python -m src.read_models
+
+which runs every refresh on a small and a larger database and exits with
+status 1 when their statement counts differ.
+"""
+from collections import namedtuple
+
+from sqlalchemy import select, tuple_
+
+from .models.models import Appointment, Patient
+from .patient_search import search_patients
+
+PatientRow = namedtuple(
+    "PatientRow", ["id", "name", "attendance_day", "health_plan"]
+)
+SessionRow = namedtuple(
+    "SessionRow", ["id", "date", "patient_name", "record_done", "record_launched"]
+)
+PatientExportRow = namedtuple(
+    "PatientExportRow",
+    [
+        "id",
+        "name",
+        "attendance_day",
+        "time",
+        "health_plan",
+        "clinic_value",
+        "therapist_percentage",
+    ],
+)
+AppointmentExportRow = namedtuple(
+    "AppointmentExportRow",
+    ["id", "date", "patient_id", "record_done", "record_launched"],
+)
+
+
+def count_patients(session, search_text):
+    return search_patients(session, search_text).count()
+
+
+def patient_rows(session, search_text, offset=0, limit=None):
+    """Patients matching ``search_text``, best matches first."""
+    query = search_patients(session, search_text).with_entities(
+        Patient.id, Patient.name, Patient.attendance_day, Patient.health_plan
+    )
+    return [PatientRow(*row) for row in query.offset(offset).limit(limit)]
+
+
+def session_rows(session, conditions=(), after=None, limit=None):
+    """
+    Sessions matching ``conditions``, newest first. ``after`` is the
+    (date, id) of the last session already shown, for keyset pagination.
+    """
+    query = (
+        session.query(
+            Appointment.id,
+            Appointment.date,
+            Patient.name,
+            Appointment.record_done,
+            Appointment.record_launched,
+        )
+        .outerjoin(Patient, Appointment.patient_id == Patient.id)
+        .filter(*conditions)
+    )
+    if after:
+        query = query.filter(tuple_(Appointment.date, Appointment.id) < after)
+    query = query.order_by(Appointment.date.desc(), Appointment.id.desc())
+    return [SessionRow(*row) for row in query.limit(limit)]
+
+
+def session_row(session, appointment_id):
+    """A single session, or None if it does not exist."""
+    rows = session_rows(session, [Appointment.id == appointment_id], limit=1)
+    return rows[0] if rows else None
+
+
+def patient_export_statement(conditions=()):
+    return (
+        select(
+            Patient.id,
+            Patient.name,
+            Patient.attendance_day,
+            Patient.time,
+            Patient.health_plan,
+            Patient.clinic_value,
+            Patient.therapist_percentage,
+        )
+        .where(*conditions)
+        .order_by(Patient.id)
+    )
+
+
+def appointment_export_statement(conditions=()):
+    return (
+        select(
+            Appointment.id,
+            Appointment.date,
+            Appointment.patient_id,
+            Appointment.record_done,
+            Appointment.record_launched,
+        )
+        .where(*conditions)
+        .order_by(Appointment.id)
+    )
+
+
+def patient_export_rows(session, conditions=()):
+    rows = session.execute(patient_export_statement(conditions))
+    return [PatientExportRow(*row) for row in rows]
+
+
+def patient_details(session, patient_id):
+    """All the fields of a single patient, or None if it does not exist."""
+    rows = patient_export_rows(session, [Patient.id == patient_id])
+    return rows[0] if rows else None
+
+
+def appointment_export_rows(session):
+    rows = session.execute(appointment_export_statement())
+    return [AppointmentExportRow(*row) for row in rows]
+
+
+def statement_counts(patients, appointments_per_patient=5):
+    """
+    Statements issued by each list and report refresh on a throwaway
+    database holding ``patients`` patients.
+    """
+    import os
+    import tempfile
+    from datetime import date, timedelta
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    from .models.database import create_db_engine, init_db
+
+    refreshes = {
+        "patient list": lambda session: (
+            count_patients(session, ""),
+            patient_rows(session, "", limit=50),
+        ),
+        # What each keystroke in the search box runs: the FTS probe, the
+        # ranked word matches and the names containing the text
+        "patient search": lambda session: (
+            count_patients(session, "Paciente 0001"),
+            patient_rows(session, "Paciente 0001", limit=50),
+        ),
+        "session list": lambda session: session_rows(session, limit=15),
+        "export": lambda session: (
+            patient_export_rows(session),
+            appointment_export_rows(session),
+        ),
+    }
+    with tempfile.TemporaryDirectory(prefix="my_income_psy_") as directory:
+        engine = create_db_engine(
+            f"sqlite:///{os.path.join(directory, 'read_models.db')}"
+        )
+        try:
+            init_db(engine)
+            with Session(engine) as session:
+                for number in range(patients):
+                    patient = Patient(
+                        name=f"Paciente {number:05d}",
+                        health_plan="PARTICULAR",
+                        clinic_value=100.0,
+                        therapist_percentage=50,
+                    )
+                    patient.appointments = [
+                        Appointment(date=date(2024, 1, 1) + timedelta(days=day))
+                        for day in range(appointments_per_patient)
+                    ]
+                    session.add(patient)
+                session.commit()
+
+            statements = []
+            event.listen(
+                engine,
+                "before_cursor_execute",
+                lambda conn, cursor, statement, *args: statements.append(statement),
+            )
+            counts = {}
+            for name, refresh in refreshes.items():
+                statements.clear()
+                with Session(engine) as session:
+                    refresh(session)
+                counts[name] = len(statements)
+        finally:
+            engine.dispose()
+    return counts
+
+
+if __name__ == "__main__":
+    # Fails when a refresh issues more statements as the data grows
+    small, large = statement_counts(5), statement_counts(200)
+    failures = 0
+    for name, count in small.items():
+        ok = large[name] == count
+        print(
+            f"{'OK  ' if ok else 'GROW'} {name}: {count} statements with 5 "
+            f"patients, {large[name]} with 200"
+        )
+        failures += not ok
+    raise SystemExit(1 if failures else 0)
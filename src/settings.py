@@ -0,0 +1,44 @@
+"""Application settings.
+
+Values are read from ``my_income_psy.ini`` next to the database and can be
+overridden by environment variables named ``MY_INCOME_PSY_<SECTION>_<OPTION>``,
+e.g. ``MY_INCOME_PSY_DATABASE_PROFILE=fast``.
+"""
+import configparser
+import os
+import sys
+from functools import lru_cache
+
+if getattr(sys, 'frozen', False):
+    # we are running in a bundle
+    basedir = os.path.dirname(sys.executable)
+else:
+    # we are running in a normal Python environment
+    basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SETTINGS_FILE = os.environ.get(
+    "MY_INCOME_PSY_SETTINGS", os.path.join(basedir, "my_income_psy.ini")
+)
+
+
+@lru_cache(maxsize=None)
+def _read_settings_file():
+    parser = configparser.ConfigParser()
+    parser.read(SETTINGS_FILE, encoding="utf-8")
+    return parser
+
+
+def get_section(section):
+    """Return every option of a section, with environment overrides applied."""
+    parser = _read_settings_file()
+    values = dict(parser[section]) if parser.has_section(section) else {}
+    prefix = f"MY_INCOME_PSY_{section}_".upper()
+    for key, value in os.environ.items():
+        if key.startswith(prefix):
+            values[key[len(prefix):].lower()] = value
+    return values
+
+
+def get_setting(section, option, default=None):
+    """Return a single setting, or ``default`` when it is not configured."""
+    return get_section(section).get(option, default)
@@ -0,0 +1,234 @@
+"""File formats for exchanging the Pacientes and Atendimentos datasets.
+
+Each format writes the datasets from chunks of rows and reads them back as
+``(sheet, DataFrame)`` batches, so neither side holds a whole dataset in
+memory. The format is chosen from the file extension:
+
+- ``.xlsx``: one workbook with a sheet per dataset;
+- ``.csv.gz`` / ``.csv``: one file per dataset, e.g. ``backup.csv.gz`` is
+  written as ``backup.Pacientes.csv.gz`` and ``backup.Atendimentos.csv.gz``;
+- ``.parquet``: one file per dataset, named the same way.
+
+Files holding a single dataset are recognised from their columns on import.
+"""
+import csv
+import gzip
+from datetime import date
+from itertools import islice
+
+from .models.models import WeekDays
+
+# Column headers of each sheet, in the order of the export queries
+PATIENT_COLUMNS = [
+    "ID",
+    "Nome",
+    "Dia de Atendimento",
+    "Hora",
+    "Plano de Saúde",
+    "Valor da Clínica",
+    "Percentual do Terapeuta",
+]
+APPOINTMENT_COLUMNS = [
+    "ID",
+    "Data",
+    "ID do Paciente",
+    "Registro Feito",
+    "Registro Lançado",
+]
+SHEET_COLUMNS = {"Pacientes": PATIENT_COLUMNS, "Atendimentos": APPOINTMENT_COLUMNS}
+# Extra column of incremental exports, true for the rows deleted since the
+# previous export (only their ID is filled)
+DELETED_COLUMN = "Excluído"
+
+# pyarrow type of each column in Parquet files
+COLUMN_TYPES = {
+    "ID": "int64",
+    "Nome": "string",
+    "Dia de Atendimento": "string",
+    "Hora": "string",
+    "Plano de Saúde": "string",
+    "Valor da Clínica": "float64",
+    "Percentual do Terapeuta": "float64",
+    "Data": "date32",
+    "ID do Paciente": "int64",
+    "Registro Feito": "bool_",
+    "Registro Lançado": "bool_",
+    DELETED_COLUMN: "bool_",
+}
+
+
+def sheet_of(columns):
+    """The dataset whose columns are all in ``columns``."""
+    for sheet, sheet_columns in SHEET_COLUMNS.items():
+        if set(sheet_columns) <= set(columns):
+            return sheet
+    raise ValueError(
+        f"Unrecognized columns {', '.join(map(str, columns))}: expected those of "
+        + " or ".join(SHEET_COLUMNS)
+    )
+
+
+def _plain(value):
+    return value.value if isinstance(value, WeekDays) else value
+
+
+class XlsxFormat:
+    extensions = (".xlsx",)
+
+    def dataset_paths(self, file_path):
+        return [file_path]
+
+    def write(self, file_path, datasets):
+        """
+        Writes ``(sheet, columns, chunks)`` datasets as sheets of one
+        workbook, with xlsxwriter in ``constant_memory`` mode, which flushes
+        each row to disk once the next one starts.
+        """
+        import xlsxwriter
+
+        counts = {}
+        workbook = xlsxwriter.Workbook(file_path, {"constant_memory": True})
+        header_format = workbook.add_format(
+            {"bold": True, "border": 1, "align": "center", "valign": "top"}
+        )
+        date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+        try:
+            for sheet, columns, chunks in datasets:
+                worksheet = workbook.add_worksheet(sheet)
+                for col, header in enumerate(columns):
+                    worksheet.write_string(0, col, header, header_format)
+
+                row_number = 0
+                for chunk in chunks:
+                    for row in chunk:
+                        row_number += 1
+                        for col, value in enumerate(row):
+                            if isinstance(value, date):
+                                worksheet.write_datetime(
+                                    row_number, col, value, date_format
+                                )
+                            else:
+                                worksheet.write(row_number, col, _plain(value))
+                counts[sheet] = row_number
+        finally:
+            workbook.close()
+        return counts
+
+    def read_batches(self, file_path, batch_size):
+        """Reads the sheets with openpyxl in read-only mode."""
+        import openpyxl
+        import pandas as pd
+
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet in SHEET_COLUMNS:
+                rows = workbook[sheet].iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+                header = [
+                    "" if column is None else str(column).strip() for column in header
+                ]
+                # Formatted but empty rows are common at the end of a sheet
+                rows = (row for row in rows if any(value is not None for value in row))
+                while batch := list(islice(rows, batch_size)):
+                    yield sheet, pd.DataFrame(batch, columns=header)
+        finally:
+            workbook.close()
+
+
+class _FilePerDataset:
+    """Formats storing each dataset in its own file."""
+
+    def dataset_path(self, file_path, sheet):
+        for extension in self.extensions:
+            if file_path.lower().endswith(extension):
+                stem = file_path[: -len(extension)]
+                return f"{stem}.{sheet}{file_path[-len(extension):]}"
+        return f"{file_path}.{sheet}"
+
+    def dataset_paths(self, file_path):
+        return [self.dataset_path(file_path, sheet) for sheet in SHEET_COLUMNS]
+
+
+class CsvFormat(_FilePerDataset):
+    """CSV files, gzip-compressed when their name ends in ``.gz``."""
+
+    extensions = (".csv.gz", ".csv")
+
+    def write(self, file_path, datasets):
+        counts = {}
+        for sheet, columns, chunks in datasets:
+            path = self.dataset_path(file_path, sheet)
+            opener = gzip.open if path.lower().endswith(".gz") else open
+            with opener(path, "wt", newline="", encoding="utf-8") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(columns)
+                counts[sheet] = 0
+                for chunk in chunks:
+                    writer.writerows([_plain(value) for value in row] for row in chunk)
+                    counts[sheet] += len(chunk)
+        return counts
+
+    def read_batches(self, file_path, batch_size):
+        import pandas as pd
+
+        # The compression is inferred from the extension
+        with pd.read_csv(file_path, chunksize=batch_size) as chunks:
+            for batch in chunks:
+                yield sheet_of(batch.columns), batch
+
+
+class ParquetFormat(_FilePerDataset):
+    """Parquet files, one row group per chunk; needs pyarrow."""
+
+    extensions = (".parquet",)
+
+    @staticmethod
+    def schema(columns):
+        import pyarrow as pa
+
+        return pa.schema(
+            [(column, getattr(pa, COLUMN_TYPES[column])()) for column in columns]
+        )
+
+    def write(self, file_path, datasets):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        counts = {}
+        for sheet, columns, chunks in datasets:
+            schema = self.schema(columns)
+            counts[sheet] = 0
+            with pq.ParquetWriter(self.dataset_path(file_path, sheet), schema) as writer:
+                for chunk in chunks:
+                    values = zip(*([_plain(value) for value in row] for row in chunk))
+                    arrays = [
+                        pa.array(column, type=field.type)
+                        for column, field in zip(values, schema)
+                    ]
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                    counts[sheet] += len(chunk)
+        return counts
+
+    def read_batches(self, file_path, batch_size):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(file_path)
+        sheet = sheet_of(parquet_file.schema_arrow.names)
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            yield sheet, batch.to_pandas()
+
+
+FORMATS = [XlsxFormat(), CsvFormat(), ParquetFormat()]
+
+
+def format_for(file_path):
+    """The format matching the extension of ``file_path``."""
+    for file_format in FORMATS:
+        if file_path.lower().endswith(file_format.extensions):
+            return file_format
+    raise ValueError(
+        f"Unsupported file type: {file_path}. Use one of: "
+        + ", ".join(extension for f in FORMATS for extension in f.extensions)
+    )
@@ -1,131 +1,475 @@
-from tkinter import messagebox  # Importa a messagebox
+import csv
+from collections import namedtuple
 
-import pandas as pd
+from sqlalchemy import delete, insert, select, update
 
+from src import change_log, data_events
 from src.models.database import get_session
 from src.models.models import (  # Ajuste o caminho conforme necessário
     Appointment,
     Patient,
     WeekDays,
 )
+from src.patient_directory import normalize
+from src.read_models import appointment_export_statement, patient_export_statement
+from src.settings import get_setting
+from src.spreadsheet_formats import (
+    APPOINTMENT_COLUMNS,
+    DELETED_COLUMN,
+    PATIENT_COLUMNS,
+    SHEET_COLUMNS,
+    format_for,
+)
 from src.utils import session_scope
 
+# sheet: "Pacientes" or "Atendimentos"; row_id: None when the ID is missing
+RejectedRow = namedtuple("RejectedRow", ["sheet", "row_id", "reason"])
+# A stored field that differs from the imported value; action tells whether
+# the stored value was kept ("ignorado", "mantido") or replaced ("atualizado")
+Conflict = namedtuple(
+    "Conflict", ["sheet", "row_id", "field", "stored", "incoming", "action"]
+)
+
+# What to do with rows whose ID is already stored: leave them alone, replace
+# every field, or only replace the fields filled in the sheet
+IMPORT_MODES = ("skip", "overwrite", "merge")
+
+# IDs looked up per IN query, below SQLite's limit of bound parameters
+ID_BATCH_SIZE = 500
+# Rows validated and written at a time while importing
+IMPORT_BATCH_SIZE = 2000
+# Text read as True in the boolean columns of CSV files
+TRUE_TEXT = {"true", "1", "sim", "yes", "verdadeiro"}
+WEEKDAYS_BY_NAME = {normalize(day.value): day for day in WeekDays}
+
+# Rows fetched from the database at a time while exporting
+EXPORT_CHUNK_SIZE = 5000
+
+# Model attributes matching the columns above
+PATIENT_FIELDS = [
+    "id",
+    "name",
+    "attendance_day",
+    "time",
+    "health_plan",
+    "clinic_value",
+    "therapist_percentage",
+]
+APPOINTMENT_FIELDS = ["id", "date", "patient_id", "record_done", "record_launched"]
+
 
 class SpreadsheetIntegration:
     def __init__(self):
         self.db_session = get_session()
 
-    def export_to_spreadsheet(self, file_path):
-        # Consulta os dados dos pacientes e atendimentos
+    def export_to_spreadsheet(self, file_path, watermark=None):
+        """
+        Writes every patient and appointment to ``file_path``, in the format
+        given by its extension (see ``src.spreadsheet_formats``).
+
+        Rows are read from the database in chunks and written as they arrive,
+        so memory use stays flat however large the database is.
+
+        Args:
+            watermark: name of the incremental backup chain this export
+                starts, e.g. ``change_log.DEFAULT_WATERMARK``. Its
+                ``export_changes`` then continue from here. Without it the
+                export is a one-off copy that leaves every chain alone.
+
+        Returns:
+            A tuple with the number of patients and appointments exported.
+        """
+        file_format = format_for(file_path)
+        with session_scope() as session:
+            until = change_log.last_seq(session)
+            counts = file_format.write(file_path, self._export_datasets(session))
+            if watermark is not None:
+                change_log.save_watermark(session, until, watermark)
+        return counts["Pacientes"], counts["Atendimentos"]
+
+    def export_changes(
+        self, file_path, since=None, watermark=change_log.DEFAULT_WATERMARK
+    ):
+        """
+        Writes only the patients and appointments inserted, updated or
+        deleted since the previous backup of the ``watermark`` chain, full or
+        incremental, then moves that watermark. Rows carry an extra
+        ``DELETED_COLUMN``; deleted rows only have their ID. Apply the file
+        with ``import_changes``.
+
+        Args:
+            since: change sequence number to start after, instead of the
+                saved watermark.
+
+        Returns:
+            A tuple with the number of patient and appointment rows written.
+        """
+        file_format = format_for(file_path)
         with session_scope() as session:
-            pacientes = session.query(Patient).all()
-            atendimentos = session.query(Appointment).all()
-
-            # Cria DataFrames
-            pacientes_df = pd.DataFrame(
-                [
-                    {
-                        "ID": paciente.id,
-                        "Nome": paciente.name,
-                        "Dia de Atendimento": paciente.attendance_day.value,
-                        "Hora": paciente.time,
-                        "Plano de Saúde": paciente.health_plan,
-                        "Valor da Clínica": paciente.clinic_value,
-                        "Percentual do Terapeuta": paciente.therapist_percentage,
-                    }
-                    for paciente in pacientes
-                ]
+            if since is None:
+                since = change_log.watermark(session, watermark)
+            until = change_log.last_seq(session)
+            counts = file_format.write(
+                file_path, self._change_datasets(session, since, until)
             )
+            change_log.save_watermark(session, until, watermark)
+        return counts["Pacientes"], counts["Atendimentos"]
 
-            atendimentos_df = pd.DataFrame(
-                [
-                    {
-                        "ID": atendimento.id,
-                        "Data": atendimento.date,
-                        "ID do Paciente": atendimento.patient_id,
-                        "Registro Feito": atendimento.record_done,
-                        "Registro Lançado": atendimento.record_launched,
-                    }
-                    for atendimento in atendimentos
-                ]
+    @staticmethod
+    def _export_datasets(session):
+        """``(sheet, columns, chunks)`` for each dataset, queried when reached."""
+        statements = {
+            "Pacientes": patient_export_statement(),
+            "Atendimentos": appointment_export_statement(),
+        }
+        for sheet, statement in statements.items():
+            result = session.execute(
+                statement, execution_options={"yield_per": EXPORT_CHUNK_SIZE}
             )
+            yield sheet, SHEET_COLUMNS[sheet], result.partitions()
 
-            # Exporta para Excel
-            with pd.ExcelWriter(
-                file_path, engine="xlsxwriter"
-            ) as writer:  # Usando o engine xlsxwriter
-                pacientes_df.to_excel(
-                    writer, sheet_name="Pacientes", index=False
-                )
-                atendimentos_df.to_excel(
-                    writer, sheet_name="Atendimentos", index=False
-                )
+    @staticmethod
+    def _change_datasets(session, since, until):
+        tables = {
+            "Pacientes": ("pacientes", Patient, patient_export_statement),
+            "Atendimentos": ("atendimentos", Appointment, appointment_export_statement),
+        }
+        for sheet, (table, model, statement) in tables.items():
+            ids = change_log.changed_ids(session, table, since, until)
+            yield sheet, SHEET_COLUMNS[sheet] + [DELETED_COLUMN], _changed_rows(
+                session, model, statement, ids, len(SHEET_COLUMNS[sheet])
+            )
+
+    def import_from_spreadsheet(self, file_path, mode=None):
+        """Imports an Excel file exported by ``export_to_spreadsheet``."""
+        return self.import_files([file_path], mode)
 
-    def import_from_spreadsheet(self, file_path):
-        # Lê os dados do Excel
-        xls = pd.ExcelFile(file_path)
+    def import_files(self, file_paths, mode=None):
+        """
+        Imports patients and appointments from Excel files with both sheets
+        and/or CSV or Parquet files holding one of them, in a single
+        transaction.
+
+        Files are read row by row and written in batches of
+        ``IMPORT_BATCH_SIZE`` rows, so memory use does not grow with the size
+        of the file and the first batches reach the database while the rest
+        is still being parsed.
+
+        Args:
+            mode: what to do with rows whose ID is already stored, one of
+                ``IMPORT_MODES``; defaults to the ``[import] mode`` setting.
+                Only rows that differ from the stored ones are written.
+
+        Returns:
+            An ``ImportReport`` with the rows inserted, updated, unchanged and
+            rejected, and the differing fields of the stored rows.
+        """
+        mode = mode or get_setting("import", "mode", "skip")
+        if mode not in IMPORT_MODES:
+            raise ValueError(
+                f"Unknown import mode '{mode}'. Choose one of: {', '.join(IMPORT_MODES)}"
+            )
+
+        report = ImportReport(mode)
+        importers = {"Pacientes": import_patients, "Atendimentos": import_appointments}
         with session_scope() as session:
-            pacientes_df = pd.read_excel(xls, "Pacientes")
-            atendimentos_df = pd.read_excel(xls, "Atendimentos")
-
-            # Importa os dados para a base de dados
-            for _, row in pacientes_df.iterrows():
-                # Verifica se o paciente já existe
-                existing_paciente = (
-                    session.query(Patient)
-                    .filter(Patient.id == row["ID"])
-                    .first()
-                )
-                if existing_paciente:
-                    # Exibe uma message box informando que a atualização não é permitida
-                    messagebox.showwarning(
-                        "ID Duplicado",
-                        f"Paciente com ID {row['ID']} já existe. Atualização não permitida.",
-                    )
-                    continue  # Pula para o próximo paciente
-
-                # Formata o dia da semana para corresponder à enumeração
-                attendance_day_value = row["Dia de Atendimento"].strip()
-                attendance_day = WeekDays.from_string(attendance_day_value)
-                if attendance_day is None:
-                    print(
-                        f"Erro: '{attendance_day_value}' não é um dia da semana válido."
+            for file_path in file_paths:
+                for sheet, batch in read_batches(file_path):
+                    importers[sheet](session, batch, report)
+            # Deleted last, as the application does: appointments first lose
+            # their patient, then the patient goes
+            for sheet, model in (("Atendimentos", Appointment), ("Pacientes", Patient)):
+                ids = report.deleted[sheet]
+                for start in range(0, len(ids), ID_BATCH_SIZE):
+                    session.execute(
+                        delete(model).where(
+                            model.id.in_(ids[start:start + ID_BATCH_SIZE])
+                        )
                     )
-                    continue  # Pula para o próximo paciente se houver um erro
-
-                paciente = Patient(
-                    id=row["ID"],
-                    name=row["Nome"],
-                    attendance_day=attendance_day,
-                    time=row["Hora"],
-                    health_plan=row["Plano de Saúde"],
-                    clinic_value=row["Valor da Clínica"],
-                    therapist_percentage=row["Percentual do Terapeuta"],
+
+        # Core inserts bypass the ORM events that notify the caches
+        data_events.publish_bulk_change(Patient, Appointment)
+        return report
+
+    def import_changes(self, file_paths):
+        """
+        Applies files written by ``export_changes``: changed rows replace the
+        stored ones and deleted rows are deleted.
+        """
+        return self.import_files(file_paths, mode="overwrite")
+
+
+def _changed_rows(session, model, statement, ids, width):
+    """Chunks of current rows for ``ids``, and ID-only rows for deleted ones."""
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        batch = ids[start:start + ID_BATCH_SIZE]
+        rows = session.execute(statement([model.id.in_(batch)])).all()
+        found = {row[0] for row in rows}
+        yield [(*row, False) for row in rows] + [
+            (row_id, *[None] * (width - 1), True)
+            for row_id in batch
+            if row_id not in found
+        ]
+
+
+def read_batches(file_path, batch_size=None):
+    """Yield ``(sheet, DataFrame)`` batches of at most ``batch_size`` rows."""
+    return format_for(file_path).read_batches(
+        file_path, batch_size or IMPORT_BATCH_SIZE
+    )
+
+
+class ImportReport:
+    """Outcome of an import, row by row."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        # Sheet name -> IDs
+        self.inserted = {"Pacientes": [], "Atendimentos": []}
+        self.updated = {"Pacientes": [], "Atendimentos": []}
+        self.unchanged = {"Pacientes": [], "Atendimentos": []}
+        # Stored rows left alone in skip mode; their fields are in conflicts
+        self.skipped = {"Pacientes": [], "Atendimentos": []}
+        self.deleted = {"Pacientes": [], "Atendimentos": []}
+        self.rejected = []
+        self.conflicts = []
+        # IDs read so far, to catch an ID repeated in another batch
+        self.seen = {"Pacientes": set(), "Atendimentos": set()}
+
+    def summary(self):
+        lines = []
+        for sheet in ("Pacientes", "Atendimentos"):
+            lines.append(
+                f"{sheet}: {len(self.inserted[sheet])} novos, "
+                f"{len(self.updated[sheet])} atualizados, "
+                f"{len(self.unchanged[sheet])} sem alterações"
+                + (
+                    f", {len(self.skipped[sheet])} ignorados por divergirem"
+                    if self.skipped[sheet]
+                    else ""
                 )
-                session.add(paciente)
-
-            for _, row in atendimentos_df.iterrows():
-                # Verifica se o atendimento já existe
-                existing_atendimento = (
-                    session.query(Appointment)
-                    .filter(Appointment.id == row["ID"])
-                    .first()
+                + (
+                    f", {len(self.deleted[sheet])} excluídos"
+                    if self.deleted[sheet]
+                    else ""
                 )
-                if existing_atendimento:
-                    # Exibe uma message box informando que a atualização não é permitida
-                    messagebox.showwarning(
-                        "ID Duplicado",
-                        f"Atendimento com ID {row['ID']} já existe. Atualização não permitida.",
-                    )
-                    continue  # Pula para o próximo atendimento
-
-                atendimento = Appointment(
-                    id=row["ID"],
-                    date=row["Data"],
-                    patient_id=row["ID do Paciente"],
-                    record_done=row["Registro Feito"],
-                    record_launched=row["Registro Lançado"],
+            )
+        lines.append(f"Linhas rejeitadas: {len(self.rejected)}")
+        lines.append(f"Campos divergentes da base de dados: {len(self.conflicts)}")
+        return "\n".join(lines)
+
+    def counts(self):
+        """The number of rows of each outcome, e.g. for a JSON report."""
+        counts = {"mode": self.mode}
+        for sheet in ("Pacientes", "Atendimentos"):
+            counts[sheet] = {
+                "inserted": len(self.inserted[sheet]),
+                "updated": len(self.updated[sheet]),
+                "unchanged": len(self.unchanged[sheet]),
+                "skipped": len(self.skipped[sheet]),
+                "deleted": len(self.deleted[sheet]),
+            }
+        counts["rejected"] = len(self.rejected)
+        counts["conflicts"] = len(self.conflicts)
+        return counts
+
+    def write_conflicts(self, file_path):
+        """Write the rejected rows and the conflicting fields to a CSV file."""
+        with open(file_path, "w", newline="", encoding="utf-8-sig") as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(
+                ["Planilha", "ID", "Campo", "Valor na base", "Valor importado", "Resultado"]
+            )
+            for row in self.rejected:
+                writer.writerow([row.sheet, row.row_id, "", "", "", row.reason])
+            for conflict in self.conflicts:
+                writer.writerow(
+                    [
+                        conflict.sheet,
+                        conflict.row_id,
+                        conflict.field,
+                        _display(conflict.stored),
+                        _display(conflict.incoming),
+                        conflict.action,
+                    ]
                 )
-                session.add(atendimento)
 
-            session.commit()
+
+def _display(value):
+    return value.value if isinstance(value, WeekDays) else value
+
+
+def stored_rows(session, model, fields, ids):
+    """Map each of ``ids`` that is stored to its ``fields``, in batched IN queries."""
+    columns = [getattr(model, field) for field in fields]
+    ids = list(ids)
+    rows = {}
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        batch = ids[start:start + ID_BATCH_SIZE]
+        for row in session.execute(select(*columns).where(model.id.in_(batch))):
+            rows[row[0]] = dict(zip(fields, row))
+    return rows
+
+
+def _reject(report, sheet, frame, mask, reason):
+    """Move the rows selected by ``mask`` to the rejected rows of the report."""
+    import pandas as pd
+
+    for row_id in frame.loc[mask, "ID"]:
+        report.rejected.append(
+            RejectedRow(sheet, None if pd.isna(row_id) else int(row_id), reason)
+        )
+    return frame[~mask]
+
+
+def _valid_ids(sheet, frame, report):
+    """Reject the rows without an ID or with an ID repeated in the sheet."""
+    import pandas as pd
+
+    frame = frame.assign(ID=pd.to_numeric(frame["ID"], errors="coerce"))
+    frame = _reject(report, sheet, frame, frame["ID"].isna(), "ID ausente ou inválido")
+    frame = frame.astype({"ID": "int64"})
+    seen = report.seen[sheet]
+    frame = _reject(
+        report,
+        sheet,
+        frame,
+        frame["ID"].duplicated() | frame["ID"].isin(seen),
+        "ID repetido na planilha",
+    )
+    seen.update(frame["ID"].tolist())
+
+    if DELETED_COLUMN in frame.columns:
+        # Rows deleted since the previous export (see export_changes)
+        deleted = _booleans(frame[DELETED_COLUMN])
+        report.deleted[sheet].extend(frame.loc[deleted, "ID"].tolist())
+        frame = frame[~deleted]
+    return frame
+
+
+def _booleans(column):
+    """Cells as booleans, reading text such as "False" or "0" from CSV files."""
+    import pandas as pd
+
+    return column.map(
+        lambda value: value.strip().lower() in TRUE_TEXT
+        if isinstance(value, str)
+        else False if pd.isna(value) else bool(value)
+    ).astype(bool)
+
+
+def _records(frame, columns, fields):
+    """Rows as dicts of plain Python values, with None for empty cells."""
+    frame = frame.rename(columns=dict(zip(columns, fields)))[fields].astype(object)
+    return frame.where(frame.notna(), None).to_dict("records")
+
+
+def _write_records(session, model, sheet, records, fields, report):
+    """
+    Insert the new records and resolve those whose ID is stored according to
+    the import mode. Stored rows are fetched in bulk and only the records that
+    differ from them are written, so re-importing unchanged rows is free.
+    """
+    stored = stored_rows(session, model, fields, [record["id"] for record in records])
+    inserts, updates = [], []
+    for record in records:
+        current = stored.get(record["id"])
+        if current is None:
+            inserts.append(record)
+            continue
+
+        changes, differs = {}, False
+        for field in fields[1:]:
+            incoming, value = record[field], current[field]
+            if incoming == value:
+                continue
+            differs = True
+            if report.mode == "skip":
+                action = "ignorado"
+            elif report.mode == "merge" and incoming is None:
+                action = "mantido"  # Empty cells do not erase stored values
+            else:
+                action = "atualizado"
+                changes[field] = incoming
+            report.conflicts.append(
+                Conflict(sheet, record["id"], field, value, incoming, action)
+            )
+
+        if report.mode == "skip" and differs:
+            # Counted once, as a conflict, not also as a rejected row
+            report.skipped[sheet].append(record["id"])
+        elif changes:
+            updates.append({"id": record["id"], **changes})
+            report.updated[sheet].append(record["id"])
+        else:
+            report.unchanged[sheet].append(record["id"])
+
+    if inserts:
+        session.execute(insert(model), inserts)
+    if updates:
+        # Bulk UPDATE by primary key, batched by the set of changed fields
+        session.execute(update(model), updates)
+    report.inserted[sheet].extend(record["id"] for record in inserts)
+
+
+def import_patients(session, frame, report):
+    """Validate a batch of rows of the Pacientes sheet and write the valid ones."""
+    import pandas as pd
+
+    frame = _valid_ids("Pacientes", frame, report)
+
+    # Maps "Terça-feira", "terca-feira" and " TERÇA-FEIRA " alike
+    days = (
+        frame["Dia de Atendimento"]
+        .astype("string")
+        .str.strip()
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore")
+        .str.decode("ascii")
+        .str.lower()
+        .map(WEEKDAYS_BY_NAME)
+    )
+    frame = frame.assign(**{"Dia de Atendimento": days})
+    frame = _reject(
+        report,
+        "Pacientes",
+        frame,
+        frame["Dia de Atendimento"].isna(),
+        "Dia da semana inválido",
+    )
+
+    frame = frame.assign(
+        **{
+            column: pd.to_numeric(frame[column], errors="coerce")
+            for column in ("Valor da Clínica", "Percentual do Terapeuta")
+        }
+    )
+
+    records = _records(frame, PATIENT_COLUMNS, PATIENT_FIELDS)
+    _write_records(session, Patient, "Pacientes", records, PATIENT_FIELDS, report)
+
+
+def import_appointments(session, frame, report):
+    """Validate a batch of rows of the Atendimentos sheet and write the valid ones."""
+    import pandas as pd
+
+    frame = _valid_ids("Atendimentos", frame, report)
+
+    frame = frame.assign(Data=pd.to_datetime(frame["Data"], errors="coerce"))
+    frame = _reject(report, "Atendimentos", frame, frame["Data"].isna(), "Data inválida")
+    frame = frame.assign(
+        Data=frame["Data"].dt.date,
+        **{
+            "ID do Paciente": pd.to_numeric(frame["ID do Paciente"], errors="coerce"),
+            "Registro Feito": _booleans(frame["Registro Feito"]),
+            "Registro Lançado": _booleans(frame["Registro Lançado"]),
+        },
+    )
+
+    records = _records(frame, APPOINTMENT_COLUMNS, APPOINTMENT_FIELDS)
+    for record in records:
+        if record["patient_id"] is not None:
+            record["patient_id"] = int(record["patient_id"])
+    _write_records(
+        session, Appointment, "Atendimentos", records, APPOINTMENT_FIELDS, report
+    )
@@ -0,0 +1,119 @@
+"""Process-wide cache of ``IncomeAnalysis`` results.
+
+Entries are keyed by the analysis filters and evicted least recently used
+first. Committed changes drop only the entries they can affect: an
+appointment change drops the date ranges containing its old or new date, a
+patient change drops the entries filtered on that patient or health plan (or
+not filtered at all).
+"""
+import copy
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+from . import data_events
+from .models.models import Appointment, Patient
+from .settings import get_setting
+
+CacheKey = namedtuple(
+    "CacheKey", ["start_date", "end_date", "patient", "health_plan", "granularity"]
+)
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "invalidations", "maxsize", "currsize"]
+)
+
+_MISSING = object()
+
+
+class StatisticsCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped on every invalidation, so results computed from data read
+        # before a change are not stored after it
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a copy of the cached value, or None on a miss."""
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key, value, generation):
+        """Store ``value`` unless the data changed since ``generation``."""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = copy.deepcopy(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def invalidate(self, predicate):
+        """Drop the entries whose key satisfies ``predicate``."""
+        with self._lock:
+            self.generation += 1
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                self.hits,
+                self.misses,
+                self.invalidations,
+                self.maxsize,
+                len(self._entries),
+            )
+
+    def on_data_changes(self, changes):
+        for change in changes:
+            if change.kind == "bulk":
+                self.clear()
+                return
+            rows = [row for row in (change.old, change.new) if row]
+            if change.model is Appointment:
+                dates = {row["date"] for row in rows}
+                self.invalidate(lambda key: _covers_any(key, dates))
+            elif change.model is Patient:
+                names = {row["name"] for row in rows}
+                plans = {row["health_plan"] for row in rows}
+                self.invalidate(
+                    lambda key: key.patient in names | {"All"}
+                    and key.health_plan in plans | {"All"}
+                )
+
+
+def _covers_any(key, dates):
+    for day in dates:
+        if day is None:
+            continue
+        if isinstance(day, datetime):
+            day = day.date()
+        if key.start_date is not None and day < key.start_date:
+            continue
+        if key.end_date is not None and day > key.end_date:
+            continue
+        return True
+    return False
+
+
+statistics_cache = StatisticsCache(int(get_setting("cache", "size", 128)))
+data_events.subscribe(statistics_cache.on_data_changes)
@@ -1,15 +1,17 @@
 from contextlib import contextmanager
+from .instrumentation import timed_session
 from .models.database import get_session
 
 @contextmanager
 def session_scope():
     """Provides a transactional scope around a series of operations."""
-    session = next(get_session())
-    try:
-        yield session
-        session.commit()
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+    with timed_session():
+        session = next(get_session())
+        try:
+            yield session
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
@@ -0,0 +1,123 @@
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+
+from src import instrumentation
+from src.instrumentation import recorder
+
+
+class DebugOverlay(tk.Frame):
+    """
+    Floating panel listing the latest UI actions with their query count, SQL
+    time and wall time; slow ones are shown in red. Toggled with F12.
+    """
+
+    COLUMNS = {
+        "name": ("Action", 220),
+        "wall_ms": ("Wall (ms)", 80),
+        "query_count": ("Queries", 65),
+        "sql_ms": ("SQL (ms)", 75),
+        "jobs": ("Jobs", 45),
+    }
+    # Rows shown; the recorder keeps more for the traces
+    VISIBLE_ACTIONS = 50
+
+    def __init__(self, master):
+        super().__init__(master, borderwidth=1, relief=tk.RIDGE)
+        self.pending_actions = []
+
+        header = ttk.Frame(self)
+        header.pack(fill=tk.X, padx=5, pady=(5, 0))
+        ttk.Label(
+            header, text=f"UI actions (slow above {recorder.slow_ms:.0f} ms)"
+        ).pack(side=tk.LEFT)
+        ttk.Button(header, text="Close", command=self.hide).pack(side=tk.RIGHT)
+
+        self.tree = ttk.Treeview(
+            self, columns=list(self.COLUMNS), show="headings", height=12
+        )
+        for column, (heading, width) in self.COLUMNS.items():
+            self.tree.heading(column, text=heading)
+            self.tree.column(
+                column, width=width, anchor=tk.W if column == "name" else tk.E
+            )
+        self.tree.tag_configure("slow", foreground="red")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        buttons = ttk.Frame(self)
+        buttons.pack(fill=tk.X, padx=5, pady=(0, 5))
+        ttk.Button(buttons, text="Save JSON trace", command=self.save_json).pack(
+            side=tk.LEFT
+        )
+        ttk.Button(buttons, text="Save CSV trace", command=self.save_csv).pack(
+            side=tk.LEFT, padx=5
+        )
+        ttk.Button(buttons, text="Clear", command=self.clear).pack(side=tk.LEFT)
+
+        for action in recorder.finished_actions()[-self.VISIBLE_ACTIONS:]:
+            self.add_row(action)
+        recorder.listeners.append(self.on_action_finished)
+        self.bind("<Destroy>", self.on_destroy, add="+")
+
+    def show(self):
+        instrumentation.enable()
+        self.place(relx=1.0, rely=0.0, anchor=tk.NE)
+        self.lift()
+
+    def hide(self):
+        self.place_forget()
+
+    def toggle(self):
+        if self.winfo_ismapped():
+            self.hide()
+        else:
+            self.show()
+
+    def on_destroy(self, event):
+        if event.widget is self and self.on_action_finished in recorder.listeners:
+            recorder.listeners.remove(self.on_action_finished)
+
+    def on_action_finished(self, action):
+        self.add_row(action)
+
+    def add_row(self, action):
+        values = action.as_dict(queries=False)
+        self.tree.insert(
+            "",
+            0,
+            values=[
+                f"{values[column]:.1f}"
+                if isinstance(values[column], float)
+                else values[column]
+                for column in self.COLUMNS
+            ],
+            tags=("slow",) if values["slow"] else (),
+        )
+        # Drop the oldest rows
+        for item in self.tree.get_children()[self.VISIBLE_ACTIONS:]:
+            self.tree.delete(item)
+
+    def clear(self):
+        recorder.clear()
+        self.tree.delete(*self.tree.get_children())
+
+    def save_json(self):
+        self.save_trace("JSON", ".json", recorder.write_json)
+
+    def save_csv(self):
+        self.save_trace("CSV", ".csv", recorder.write_csv)
+
+    def save_trace(self, kind, extension, write):
+        file_path = filedialog.asksaveasfilename(
+            title=f"Save {kind} trace",
+            defaultextension=extension,
+            filetypes=[(f"{kind} files", f"*{extension}"), ("All files", "*.*")],
+            parent=self,
+        )
+        if not file_path:
+            return
+        try:
+            write(file_path)
+        except OSError as error:
+            messagebox.showerror("Error", str(error), parent=self)
+            return
+        messagebox.showinfo("Success", "Trace saved!", parent=self)
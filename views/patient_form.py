@@ -2,7 +2,9 @@ import tkinter as tk
 from tkinter import messagebox
 from src.models.models import Patient, WeekDays
 from tkinter import ttk
-from src.utils import session_scope
+from src.db_worker import db_executor
+from src.instrumentation import ui_action
+from src.read_models import patient_details
 
 class PatientFormView(tk.Frame):
     def __init__(self, master, show_view_callback, patient_id=None):
@@ -82,19 +84,36 @@ class PatientFormView(tk.Frame):
         if self.patient_id:
             self.load_patient_data()
 
+    def open(self, patient_id=None):
+        """Show the form for another patient, or empty for a new one"""
+        self.clear_form()
+        self.patient_id = patient_id
+        self.patient = None
+        if self.patient_id:
+            self.load_patient_data()
+
     def load_patient_data(self):
         """Load patient data from database and populate the form"""
-        with session_scope() as session:
-            self.patient = session.query(Patient).filter(Patient.id == self.patient_id).first()
-            if self.patient:
-                self.name_entry.insert(0, self.patient.name)
-                self.day_combo.set(self.patient.attendance_day.value)
-                self.time_entry.insert(0, self.patient.time)
-                self.health_plan_entry.insert(0, self.patient.health_plan)
-                self.clinic_value_entry.insert(0, str(self.patient.clinic_value))
-                self.therapist_percentage_entry.insert(0, str(self.patient.therapist_percentage))
-                self.calculate_therapist_value()
+        db_executor.submit(
+            patient_details,
+            self.patient_id,
+            widget=self,
+            key=(id(self), "load"),
+            on_success=self.show_patient_data,
+        )
 
+    def show_patient_data(self, patient):
+        self.patient = patient
+        if self.patient:
+            self.name_entry.insert(0, self.patient.name)
+            self.day_combo.set(self.patient.attendance_day.value)
+            self.time_entry.insert(0, self.patient.time)
+            self.health_plan_entry.insert(0, self.patient.health_plan)
+            self.clinic_value_entry.insert(0, str(self.patient.clinic_value))
+            self.therapist_percentage_entry.insert(0, str(self.patient.therapist_percentage))
+            self.calculate_therapist_value()
+
+    @ui_action
     def save_patient(self):
         """Save patient data from form fields"""
         name = self.name_entry.get()
@@ -114,34 +133,33 @@ class PatientFormView(tk.Frame):
             messagebox.showerror("Error", "Invalid number format. Use numbers with '.' or ',' as decimal separators.")
             return
 
-        with session_scope() as session:
-            if self.patient_id:  # Editing existing patient
-                patient = session.query(Patient).filter(Patient.id == self.patient_id).first()
-                if patient:
-                    patient.name = name
-                    patient.attendance_day = WeekDays(attendance_day)
-                    patient.time = time
-                    patient.health_plan = health_plan
-                    patient.clinic_value = clinic_value
-                    patient.therapist_percentage = therapist_percentage
-                    session.commit()
-                    messagebox.showinfo("Success", "Patient updated successfully!")
-                else:
-                     messagebox.showerror("Error", "Patient not found!")
-            else:  # Creating a new patient
-                new_patient = Patient(
-                    name=name,
-                    attendance_day=WeekDays(attendance_day),
-                    time=time,
-                    health_plan=health_plan,
-                    clinic_value=clinic_value,
-                    therapist_percentage=therapist_percentage
-                )
-                session.add(new_patient)
-                session.commit()
+        values = {
+            "name": name,
+            "attendance_day": WeekDays(attendance_day),
+            "time": time,
+            "health_plan": health_plan,
+            "clinic_value": clinic_value,
+            "therapist_percentage": therapist_percentage,
+        }
+        editing = bool(self.patient_id)
+
+        def on_saved(saved):
+            if not saved:
+                messagebox.showerror("Error", "Patient not found!")
+            elif editing:
+                messagebox.showinfo("Success", "Patient updated successfully!")
+            else:
                 messagebox.showinfo("Success", "Patient created successfully!")
-
-        self.show_view("patient_list")
+            self.show_view("patient_list")
+
+        db_executor.submit(
+            save_patient,
+            self.patient_id,
+            values,
+            widget=self,
+            write=True,
+            on_success=on_saved,
+        )
 
     def clear_form(self):
         """Clear all form fields"""
@@ -170,3 +188,16 @@ class PatientFormView(tk.Frame):
             self.therapist_value_entry.delete(0, tk.END)
             self.therapist_value_entry.config(state="readonly")
             messagebox.showerror("Error", "Invalid number format in Clinic Value or Therapist Percentage.")
+
+
+def save_patient(session, patient_id, values):
+    """Create a patient, or update it if ``patient_id`` is given"""
+    if patient_id:  # Editing existing patient
+        patient = session.query(Patient).filter(Patient.id == patient_id).first()
+        if not patient:
+            return False
+        for field, value in values.items():
+            setattr(patient, field, value)
+    else:  # Creating a new patient
+        session.add(Patient(**values))
+    return True
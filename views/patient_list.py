@@ -1,15 +1,24 @@
 import tkinter as tk
 from tkinter import messagebox, ttk
 
+from src.db_worker import db_executor
+from src.instrumentation import ui_action
 from src.models.models import Patient
-from src.utils import session_scope
+from src.read_models import count_patients, patient_rows
+from views.virtual_list import VirtualList
 
 
 class PatientListView(tk.Frame):
+    # Wait for a pause in typing before searching
+    SEARCH_DELAY_MS = 250
+    # Refreshed by the controller when these change while hidden
+    depends_on = (Patient,)
+
     def __init__(self, master, show_view_callback):
         super().__init__(master)
         self.show_view = show_view_callback
-        self.patient_buttons = []
+        self.pending_search = None
+        self.search_text = ""
         self.search_var = (
             tk.StringVar()
         )  # Variável para armazenar o texto de pesquisa
@@ -60,94 +69,95 @@ class PatientListView(tk.Frame):
         search_entry = tk.Entry(search_frame, textvariable=self.search_var)
         search_entry.pack(side=tk.LEFT)
         search_entry.bind(
-            "<KeyRelease>", self.update_patient_list
+            "<KeyRelease>", self.schedule_search
         )  # Atualiza a lista ao digitar
 
         # Separator
         separator = ttk.Separator(self, orient="horizontal")
         separator.pack(fill="x", padx=5, pady=5)
 
-        # Create a canvas for scrolling
-        self.canvas = tk.Canvas(self)
-        self.scrollbar = tk.Scrollbar(
-            self, orient="vertical", command=self.canvas.yview
+        # Virtualized list: only the visible rows exist as widgets
+        self.patient_list = VirtualList(
+            self,
+            create_row=self.create_patient_row,
+            fill_row=self.fill_patient_row,
+            count_rows=None,  # Counted in the background
+            fetch_rows=self.fetch_patients,
+            width=700,
+            height=500,
         )
-        self.scrollable_frame = tk.Frame(self.canvas)
+        self.patient_list.pack(fill=tk.BOTH, expand=True)
+
+        self.update_patient_list()
+
+    def refresh(self):
+        self.update_patient_list()
 
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(
-                scrollregion=self.canvas.bbox("all")
-            ),
+    def schedule_search(self, event=None):
+        """Debounce keystrokes: only the last one of a burst runs the search"""
+        if self.pending_search is not None:
+            self.after_cancel(self.pending_search)
+        self.pending_search = self.after(
+            self.SEARCH_DELAY_MS, self.update_patient_list
         )
 
-        self.canvas.create_window(
-            (0, 0), window=self.scrollable_frame, anchor="nw"
+    @ui_action
+    def update_patient_list(self, event=None):
+        self.pending_search = None
+        search_text = self.search_var.get()  # Obtém o texto de pesquisa
+        if search_text != self.search_text:
+            self.search_text = search_text
+            self.patient_list.top = 0  # New results start from the top
+
+        # A newer search supersedes the count of an older one
+        db_executor.submit(
+            count_patients,
+            search_text,
+            widget=self,
+            key=(id(self), "count"),
+            on_success=self.patient_list.refresh,
         )
 
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+    def fetch_patients(self, offset, limit):
+        """Request one page of patients; the list receives it when loaded"""
+        search_text = self.search_text
+
+        def show_page(rows):
+            if search_text == self.search_text:
+                self.patient_list.page_loaded(offset, rows)
+
+        db_executor.submit(
+            patient_page,
+            search_text,
+            offset,
+            limit,
+            widget=self,
+            key=(id(self), "page", offset),
+            on_success=show_page,
+        )
+        return None
 
-        # Pack the canvas and scrollbar
-        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    def create_patient_row(self, parent):
+        patient_frame = tk.Frame(parent)
+        patient_frame.info_label = tk.Label(patient_frame, anchor="w")
+        patient_frame.info_label.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
 
-        self.update_patient_list()
+        patient_frame.delete_button = tk.Button(patient_frame, text="Delete")
+        patient_frame.delete_button.pack(side=tk.RIGHT, padx=5)
 
-    def update_patient_list(self, event=None):
-        # Destroy existing buttons to prevent accumulation
-        for button in self.patient_buttons:
-            button.destroy()
-        self.patient_buttons = []
-
-        # Limpa o frame de pacientes antes de adicionar novos
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-
-        search_text = self.search_var.get().lower()  # Obtém o texto de pesquisa
-
-        with session_scope() as session:
-            # Consulta os pacientes em ordem alfabética e filtra pelo texto de pesquisa
-            patients = (
-                session.query(Patient)
-                .filter(
-                    Patient.name.ilike(f"%{search_text}%")  # Filtra pelo nome
-                )
-                .order_by(Patient.name)
-                .all()
-            )  # Ordena em ordem alfabética
-
-            for patient in patients:
-                patient_frame = tk.Frame(self.scrollable_frame)
-                patient_frame.pack(pady=5)
-
-                # Acesse o valor da enumeração para exibir o dia de atendimento
-                attendance_day_value = (
-                    patient.attendance_day.value
-                    if patient.attendance_day
-                    else "Não definido"
-                )
-                patient_info = f"{patient.name} - Dia: {attendance_day_value} - Plano: {patient.health_plan or 'Nenhum'}"
-                tk.Label(patient_frame, text=patient_info).pack(
-                    side=tk.LEFT, padx=5
-                )
-
-                edit_button = tk.Button(
-                    patient_frame,
-                    text="Edit",
-                    command=lambda id=patient.id: self.edit_patient_form(id),
-                )
-                edit_button.pack(side=tk.LEFT, padx=5)
-                self.patient_buttons.append(edit_button)
-
-                delete_button = tk.Button(
-                    patient_frame,
-                    text="Delete",
-                    command=lambda id=patient.id: self.delete_patient_wrapper(
-                        id
-                    ),
-                )
-                delete_button.pack(side=tk.LEFT, padx=5)
-                self.patient_buttons.append(delete_button)
+        patient_frame.edit_button = tk.Button(patient_frame, text="Edit")
+        patient_frame.edit_button.pack(side=tk.RIGHT, padx=5)
+        return patient_frame
+
+    def fill_patient_row(self, patient_frame, row):
+        patient_id, patient_info = row
+        patient_frame.info_label.config(text=patient_info)
+        patient_frame.edit_button.config(
+            command=lambda id=patient_id: self.edit_patient_form(id)
+        )
+        patient_frame.delete_button.config(
+            command=lambda id=patient_id: self.delete_patient_wrapper(id)
+        )
 
     def edit_patient_form(self, patient_id):
         self.show_view("patient_form", patient_id=patient_id)
@@ -156,13 +166,32 @@ class PatientListView(tk.Frame):
         if messagebox.askyesno(
             "Delete Patient", "Are you sure you want to delete this patient?"
         ):
-            self.delete_patient(patient_id)
-            self.update_patient_list()
-
-    def delete_patient(self, patient_id):
-        with session_scope() as session:
-            patient = (
-                session.query(Patient).filter(Patient.id == patient_id).first()
+            db_executor.submit(
+                delete_patient,
+                patient_id,
+                widget=self,
+                write=True,
+                on_success=lambda result: self.update_patient_list(),
             )
-            if patient:
-                session.delete(patient)
+
+
+def patient_page(session, search_text, offset, limit):
+    """Load one page of patients as (id, description) pairs"""
+    # Busca no nome e no plano de saúde, melhores resultados primeiro
+    rows = []
+    for patient in patient_rows(session, search_text, offset, limit):
+        # Acesse o valor da enumeração para exibir o dia de atendimento
+        attendance_day_value = (
+            patient.attendance_day.value
+            if patient.attendance_day
+            else "Não definido"
+        )
+        patient_info = f"{patient.name} - Dia: {attendance_day_value} - Plano: {patient.health_plan or 'Nenhum'}"
+        rows.append((patient.id, patient_info))
+    return rows
+
+
+def delete_patient(session, patient_id):
+    patient = session.query(Patient).filter(Patient.id == patient_id).first()
+    if patient:
+        session.delete(patient)
@@ -4,16 +4,30 @@ from tkinter import messagebox, ttk
 
 from tkcalendar import DateEntry
 
+from src.db_worker import db_executor
+from src.instrumentation import ui_action
 from src.models.models import Appointment, Patient
-from src.utils import session_scope
+from src.patient_directory import patient_directory
+from src.read_models import session_row, session_rows
 
 
 class SessionFormView(ttk.Frame):
+    # Sessions loaded each time the list scrolls near its end
+    PAGE_SIZE = 15
+    # Refreshed by the controller when these change while hidden
+    depends_on = (Patient, Appointment)
+
     def __init__(self, master, show_view_callback):
         super().__init__(master)
         self.show_view = show_view_callback
         self.selected_appointment_id = None
 
+        # Keyset pagination state: (date, id) of the last session shown
+        self.last_loaded = None
+        self.has_more_sessions = True
+        self.page_scheduled = False
+        self.jump_date = None
+
         # Title label
         title_label = ttk.Label(self, text="Session Form", font=("Arial", 16))
         # Center align all widgets
@@ -143,8 +157,30 @@ class SessionFormView(ttk.Frame):
         self.filter_end_date_entry.set_date(datetime.now())
         self.filter_end_date_entry.grid(row=1, column=3, padx=5, sticky="w")
 
+        # Jump to date
+        ttk.Label(self.filters_frame, text="Jump to:").grid(
+            row=2, column=0, sticky="w"
+        )
+        self.jump_date_entry = DateEntry(
+            self.filters_frame,
+            width=12,
+            background="darkblue",
+            foreground="white",
+            borderwidth=2,
+            date_pattern="dd-mm-yyyy",
+        )
+        self.jump_date_entry.grid(row=2, column=1, padx=5, sticky="w")
+        ttk.Button(
+            self.filters_frame, text="Go", command=self.jump_to_date
+        ).grid(row=2, column=2, padx=5, sticky="w")
+
         self.filter_applied = False
 
+        style = ttk.Style()
+        style.configure("Red.TLabel", background="red")
+        style.configure("Orange.TLabel", background="orange")
+        style.configure("Green.TLabel", background="green")
+
         # Create a canvas for scrolling
         self.canvas = tk.Canvas(self)
         self.scrollbar = ttk.Scrollbar(
@@ -158,7 +194,7 @@ class SessionFormView(ttk.Frame):
         )
 
         self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.configure(yscrollcommand=self.on_sessions_scroll)
 
         # Pack the canvas and scrollbar
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, anchor="center")
@@ -168,31 +204,29 @@ class SessionFormView(ttk.Frame):
 
         self.update_sessions_list()
 
-    def get_patient_names(self):
-        """Fetch patient names from the database ordered alphabetically"""
-        with session_scope() as session:
-            patients = session.query(Patient).order_by(Patient.name).all()
-            return [patient.name for patient in patients]
+    def refresh(self):
+        self.load_patient_names()
+        self.update_sessions_list()
+
+    def load_patient_names(self):
+        """Fill the patient combobox once the patient directory is loaded"""
+        db_executor.submit(
+            patient_names,
+            widget=self,
+            key=(id(self), "patient_names"),
+            on_success=lambda names: self.patient_combo.config(values=names),
+        )
 
     def setup_patient_combobox(self):
         """Configure patient combobox with autocomplete feature"""
-        self.patient_combo = ttk.Combobox(
-            self.form_frame, values=self.get_patient_names()
-        )
+        self.patient_combo = ttk.Combobox(self.form_frame, values=[])
         self.patient_combo.grid(row=0, column=1, sticky="ew", pady=5)
+        self.load_patient_names()
 
         def on_type(event):
             """Filter combobox values based on user input"""
-            value = event.widget.get().lower()
-            all_patients = self.get_patient_names()
-
-            if value:
-                filtered_patients = [
-                    patient for patient in all_patients if value in patient.lower()
-                ]
-                self.patient_combo["values"] = filtered_patients
-            else:
-                self.patient_combo["values"] = all_patients
+            # The directory answers from memory, without querying the database
+            self.patient_combo["values"] = patient_directory.search(event.widget.get())
 
             # Show dropdown list
             self.patient_combo.event_generate("<Down>")
@@ -200,6 +234,7 @@ class SessionFormView(ttk.Frame):
         # Bind to both KeyRelease and KeyPress to ensure dropdown stays open
         self.patient_combo.bind("<KeyRelease>", on_type)
 
+    @ui_action
     def save_session(self):
         """Save the session data to the database"""
         patient_name = self.patient_combo.get()
@@ -220,41 +255,34 @@ class SessionFormView(ttk.Frame):
             messagebox.showerror("Error", "Select a patient.")
             return
 
-        with session_scope() as session:
-            patient = (
-                session.query(Patient).filter(Patient.name == patient_name).first()
-            )
-            if patient:
-                if self.selected_appointment_id:
-                    # Editing existing session
-                    appointment_to_update = (
-                        session.query(Appointment)
-                        .filter(Appointment.id == self.selected_appointment_id)
-                        .first()
-                    )
-                    if appointment_to_update:
-                        appointment_to_update.date = session_date
-                        appointment_to_update.patient_id = patient.id
-                        appointment_to_update.record_done = record_done
-                        appointment_to_update.record_launched = record_launched
-                        messagebox.showinfo("Success", "Session updated successfully!")
-                    else:
-                        messagebox.showerror("Error", "Session not found.")
-                else:
-                    # Creating new session
-                    new_appointment = Appointment(
-                        date=session_date,
-                        patient_id=patient.id,
-                        record_done=record_done,
-                        record_launched=record_launched,
-                    )
-                    session.add(new_appointment)
-                    messagebox.showinfo("Success", "Session saved successfully!")
+        values = {
+            "date": session_date,
+            "record_done": record_done,
+            "record_launched": record_launched,
+        }
+        editing = bool(self.selected_appointment_id)
+
+        def on_saved(error):
+            if error:
+                messagebox.showerror("Error", error)
+                return
+            if editing:
+                messagebox.showinfo("Success", "Session updated successfully!")
             else:
-                messagebox.showerror("Error", "Patient not found.")
-
-        self.update_sessions_list()
-        self.clear_form()
+                messagebox.showinfo("Success", "Session saved successfully!")
+            self.update_sessions_list()
+            self.clear_form()
+
+        # The patient is looked up in the job: the directory may still be loading
+        db_executor.submit(
+            save_appointment,
+            self.selected_appointment_id,
+            patient_name,
+            values,
+            widget=self,
+            write=True,
+            on_success=on_saved,
+        )
 
     def delete_session(self):
         """Delete the selected session from the database"""
@@ -265,108 +293,150 @@ class SessionFormView(ttk.Frame):
         if messagebox.askyesno(
             "Confirm Deletion", "Are you sure you want to delete this session?"
         ):
-            with session_scope() as session:
-                appointment_to_delete = (
-                    session.query(Appointment)
-                    .filter(Appointment.id == self.selected_appointment_id)
-                    .first()
-                )
-                if appointment_to_delete:
-                    session.delete(appointment_to_delete)
+
+            def on_deleted(deleted):
+                if deleted:
                     messagebox.showinfo("Success", "Session deleted successfully!")
-                    self.update_sessions_list()
                     self.clear_form()
                 else:
                     messagebox.showerror("Error", "Session not found.")
-        self.update_sessions_list()  # update session list after delete
+                self.update_sessions_list()  # update session list after delete
+
+            db_executor.submit(
+                delete_appointment,
+                self.selected_appointment_id,
+                widget=self,
+                write=True,
+                on_success=on_deleted,
+            )
 
     def load_session_for_editing(self, session_id):
         """Load the selected session's data into the form for editing"""
-        with session_scope() as session:
-            appointment_to_load = (
-                session.query(Appointment).filter(Appointment.id == session_id).first()
-            )
-
-            if appointment_to_load:
-                self.selected_appointment_id = appointment_to_load.id
-                self.patient_combo.set(
-                    appointment_to_load.patient.name
-                    if appointment_to_load.patient
-                    else ""
-                )
-                self.date_entry.delete(0, tk.END)
-                self.date_entry.insert(0, appointment_to_load.date.strftime("%d-%m-%Y"))
-                self.record_done_var.set(appointment_to_load.record_done)
-                self.record_launched_var.set(appointment_to_load.record_launched)
-                self.delete_button.config(state=tk.NORMAL)  # Enable delete button
-                self.save_button.config(text="Update")  # Change button text to "Update"
-            else:
-                messagebox.showerror("Error", "Session not found.")
+        db_executor.submit(
+            session_row,
+            session_id,
+            widget=self,
+            key=(id(self), "edit"),
+            on_success=self.show_session_for_editing,
+        )
 
+    def show_session_for_editing(self, appointment_to_load):
+        if appointment_to_load:
+            self.selected_appointment_id = appointment_to_load.id
+            self.patient_combo.set(appointment_to_load.patient_name or "")
+            self.date_entry.delete(0, tk.END)
+            self.date_entry.insert(0, appointment_to_load.date.strftime("%d-%m-%Y"))
+            self.record_done_var.set(appointment_to_load.record_done)
+            self.record_launched_var.set(appointment_to_load.record_launched)
+            self.delete_button.config(state=tk.NORMAL)  # Enable delete button
+            self.save_button.config(text="Update")  # Change button text to "Update"
+        else:
+            messagebox.showerror("Error", "Session not found.")
+
+    @ui_action
     def update_sessions_list(self):
-        """Update the list of latest sessions"""
+        """Reload the list of latest sessions, starting from the first page"""
         for widget in self.scrollable_frame.winfo_children():
             widget.destroy()
 
-        with session_scope() as session:
-            query = session.query(Appointment)
-
-            if self.filter_applied:
-                if self.filter_record_done_var.get():
-                    query = query.filter(Appointment.record_done)
-                if self.filter_record_launched_var.get():
-                    query = query.filter(Appointment.record_launched)
-
-                start_date = self.filter_start_date_entry.get()
-                end_date = self.filter_end_date_entry.get()
-                if start_date and end_date:
-                    try:
-                        start_date = datetime.strptime(start_date, "%d-%m-%Y").date()
-                        end_date = datetime.strptime(end_date, "%d-%m-%Y").date()
-                        query = query.filter(
-                            Appointment.date.between(start_date, end_date)
-                        )
-                    except ValueError:
-                        messagebox.showerror(
-                            "Error", "Invalid date format. Use dd-mm-yyyy."
-                        )
-                        return
-
-            appointments = query.order_by(Appointment.date.desc()).limit(15).all()
-
-            style = ttk.Style()
-            style.configure("Red.TLabel", background="red")
-            style.configure("Orange.TLabel", background="orange")
-            style.configure("Green.TLabel", background="green")
-
-            for appointment in appointments:
-                patient_name = (
-                    appointment.patient.name if appointment.patient else "N/A"
-                )
-                session_info = f"{appointment.date.strftime('%d-%m-%Y')} - {patient_name} - Done: {appointment.record_done} - Launched: {appointment.record_launched}"
-
-                # Create the label with appropriate style
-                style_name = "TLabel"
-                if not appointment.record_done:
-                    style_name = "Red.TLabel"
-                elif not appointment.record_launched:
-                    style_name = "Orange.TLabel"
-                else:
-                    style_name = "Green.TLabel"
+        self.last_loaded = None
+        self.has_more_sessions = True
+        self.canvas.yview_moveto(0)
+        self.load_next_sessions_page()
+
+    def on_sessions_scroll(self, first, last):
+        """Update the scrollbar and fetch the next page near the bottom"""
+        self.scrollbar.set(first, last)
+        if float(last) >= 0.9 and self.has_more_sessions and not self.page_scheduled:
+            self.page_scheduled = True
+            self.after_idle(self.load_next_sessions_page)
+
+    def session_filters(self):
+        """Build the filter conditions, or return None if a date is invalid"""
+        conditions = []
+        if self.filter_applied:
+            if self.filter_record_done_var.get():
+                conditions.append(Appointment.record_done)
+            if self.filter_record_launched_var.get():
+                conditions.append(Appointment.record_launched)
+
+            start_date = self.filter_start_date_entry.get()
+            end_date = self.filter_end_date_entry.get()
+            if start_date and end_date:
+                try:
+                    start_date = datetime.strptime(start_date, "%d-%m-%Y").date()
+                    end_date = datetime.strptime(end_date, "%d-%m-%Y").date()
+                except ValueError:
+                    messagebox.showerror(
+                        "Error", "Invalid date format. Use dd-mm-yyyy."
+                    )
+                    return None
+                conditions.append(Appointment.date.between(start_date, end_date))
+
+        if self.jump_date:
+            conditions.append(Appointment.date <= self.jump_date)
+        return conditions
+
+    @ui_action
+    def load_next_sessions_page(self):
+        """
+        Append the next page of sessions, newest first. Pages are sought by
+        the (date, id) of the last session shown instead of an OFFSET, so
+        every page costs the same however deep the list is scrolled.
+        """
+        if not self.has_more_sessions:
+            self.page_scheduled = False
+            return
 
-                label = ttk.Label(
-                    self.scrollable_frame, text=session_info, style=style_name, anchor="center"
-                )
+        conditions = self.session_filters()
+        if conditions is None:
+            self.has_more_sessions = False
+            self.page_scheduled = False
+            return
 
-                label.bind(
-                    "<Button-1>",
-                    lambda e,
-                    appointment_id=appointment.id: self.load_session_for_editing(
-                        appointment_id
-                    ),
-                )
+        # Resetting the list supersedes a page still loading
+        db_executor.submit(
+            session_rows,
+            conditions,
+            self.last_loaded,
+            self.PAGE_SIZE,
+            widget=self,
+            key=(id(self), "sessions"),
+            on_success=self.show_sessions_page,
+        )
 
-                label.pack(pady=5, padx=150, anchor="center")
+    def show_sessions_page(self, appointments):
+        self.page_scheduled = False
+        for appointment in appointments:
+            patient_name = appointment.patient_name or "N/A"
+            session_info = f"{appointment.date.strftime('%d-%m-%Y')} - {patient_name} - Done: {appointment.record_done} - Launched: {appointment.record_launched}"
+
+            # Create the label with appropriate style
+            style_name = "TLabel"
+            if not appointment.record_done:
+                style_name = "Red.TLabel"
+            elif not appointment.record_launched:
+                style_name = "Orange.TLabel"
+            else:
+                style_name = "Green.TLabel"
+
+            label = ttk.Label(
+                self.scrollable_frame, text=session_info, style=style_name, anchor="center"
+            )
+
+            label.bind(
+                "<Button-1>",
+                lambda e,
+                appointment_id=appointment.id: self.load_session_for_editing(
+                    appointment_id
+                ),
+            )
+
+            label.pack(pady=5, padx=150, anchor="center")
+
+        if appointments:
+            self.last_loaded = (appointments[-1].date, appointments[-1].id)
+        self.has_more_sessions = len(appointments) == self.PAGE_SIZE
 
     def clear_form(self):
         """Clear the form fields and reset to default state"""
@@ -382,8 +452,62 @@ class SessionFormView(ttk.Frame):
     def clear_filters(self):
         """Clear all filters and reset the session list to show the latest appointments."""
         self.filter_applied = False
+        self.jump_date = None
         self.update_sessions_list()
 
     def apply_filters(self):
         self.filter_applied = True
         self.update_sessions_list()
+
+    def jump_to_date(self):
+        """Show the sessions from the chosen date backwards"""
+        self.jump_date = self.jump_date_entry.get_date()
+        self.update_sessions_list()
+
+
+def patient_names(session):
+    # Loads the directory on this worker thread if needed
+    patient_directory.load(session)
+    return patient_directory.names()
+
+
+def save_appointment(session, appointment_id, patient_name, values):
+    """
+    Create a session, or update it if ``appointment_id`` is given. Returns
+    an error message, or None once saved.
+    """
+    # Names are not unique; use the lowest id, as find_by_name does
+    patient_id = (
+        session.query(Patient.id)
+        .filter(Patient.name == patient_name)
+        .order_by(Patient.id)
+        .limit(1)
+        .scalar()
+    )
+    if patient_id is None:
+        return "Patient not found."
+    values = dict(values, patient_id=patient_id)
+
+    if appointment_id:
+        # Editing existing session
+        appointment = (
+            session.query(Appointment).filter(Appointment.id == appointment_id).first()
+        )
+        if not appointment:
+            return "Session not found."
+        for field, value in values.items():
+            setattr(appointment, field, value)
+    else:
+        # Creating new session
+        session.add(Appointment(**values))
+    return None
+
+
+def delete_appointment(session, appointment_id):
+    appointment = (
+        session.query(Appointment).filter(Appointment.id == appointment_id).first()
+    )
+    if not appointment:
+        return False
+    session.delete(appointment)
+    return True
@@ -1,10 +1,29 @@
+import os
 import tkinter as tk
-from tkinter import filedialog, ttk
+from tkinter import filedialog, messagebox, ttk
 
-from src.spreadsheet_integration import SpreadsheetIntegration
+from src.change_log import DEFAULT_WATERMARK
+from src.db_worker import db_executor
+from src.settings import get_setting
+from src.spreadsheet_formats import format_for
+from src.spreadsheet_integration import IMPORT_MODES, SpreadsheetIntegration
 
 
 class SpreadsheetIntegrationForm(tk.Frame):
+    # Formats offered by the save and open dialogs, chosen by extension
+    FILE_TYPES = [
+        ("Excel files", "*.xlsx"),
+        ("Compressed CSV files", "*.csv.gz"),
+        ("CSV files", "*.csv"),
+        ("Parquet files", "*.parquet"),
+        ("All files", "*.*"),
+    ]
+    IMPORT_MODE_LABELS = {
+        "skip": "Skip",
+        "overwrite": "Overwrite",
+        "merge": "Merge changed fields",
+    }
+
     def __init__(self, master, show_view_callback):
         super().__init__(master)
         self.show_view = show_view_callback
@@ -12,9 +31,10 @@ class SpreadsheetIntegrationForm(tk.Frame):
         self.spreadsheet_to_save = ""
         self.integration = SpreadsheetIntegration()
 
-        # Cria uma instância de Tk
+        # Cria uma instância de Tk, filha deste frame para ser destruída
+        # junto com ele quando o controller descarta a view
         self.root = tk.Toplevel(
-            master
+            self
         )  # Use Toplevel para não criar uma nova janela principal
         self.root.withdraw()  # Oculta a janela principal
 
@@ -22,6 +42,20 @@ class SpreadsheetIntegrationForm(tk.Frame):
             pady=10, anchor="center"
         )
 
+        # What to do with rows already in the database
+        mode_frame = ttk.Frame(self)
+        mode_frame.pack(pady=(20, 0), anchor="center")
+        ttk.Label(mode_frame, text="Existing rows:").pack(side=tk.LEFT, padx=5)
+        self.import_mode_combo = ttk.Combobox(
+            mode_frame, values=list(self.IMPORT_MODE_LABELS.values()), state="readonly"
+        )
+        mode = get_setting("import", "mode", "skip")
+        # A mistyped setting falls back to the default instead of failing
+        self.import_mode_combo.set(
+            self.IMPORT_MODE_LABELS[mode if mode in IMPORT_MODES else "skip"]
+        )
+        self.import_mode_combo.pack(side=tk.LEFT)
+
         ttk.Button(
             self,
             text="Open spreadsheet",
@@ -34,6 +68,18 @@ class SpreadsheetIntegrationForm(tk.Frame):
             command=self.save_archive_selector,
         ).pack(pady=20, anchor="center")
 
+        ttk.Button(
+            self,
+            text="Save changes since last backup",
+            command=self.save_changes_selector,
+        ).pack(pady=(0, 10), anchor="center")
+
+        ttk.Button(
+            self,
+            text="Open changes file",
+            command=self.open_changes_selector,
+        ).pack(pady=(0, 10), anchor="center")
+
         ttk.Button(
             self,
             text="Return to patient list",
@@ -41,19 +87,142 @@ class SpreadsheetIntegrationForm(tk.Frame):
         ).pack(pady=50, anchor="center")
 
     def open_archive_selector(self):
-        self.spreadsheet_to_open = filedialog.askopenfilename(
+        # An Excel file with both sheets, or CSV/Parquet files with one each
+        self.spreadsheet_to_open = filedialog.askopenfilenames(
             title="Select spreadsheet",
+            filetypes=[
+                ("Spreadsheets", "*.xlsx *.csv *.csv.gz *.parquet"),
+            ]
+            + self.FILE_TYPES,
             parent=self.root,  # Use parent=self.root
         )
         if self.spreadsheet_to_open:
-            self.integration.import_from_spreadsheet(self.spreadsheet_to_open)
+            # The import opens its own session; it only needs the worker thread
+            db_executor.submit(
+                self.integration.import_files,
+                self.spreadsheet_to_open,
+                self.import_mode(),
+                widget=self,
+                write=True,
+                session=False,
+                on_success=self.show_import_report,
+                on_error=self.show_error,
+            )
 
     def save_archive_selector(self):
         self.spreadsheet_to_save = filedialog.asksaveasfilename(
             title="Save Spreadsheet",
             defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")],
+            filetypes=self.FILE_TYPES,
             parent=self.root,  # Use parent=self.root
         )
         if self.spreadsheet_to_save:
-            self.integration.export_to_spreadsheet(self.spreadsheet_to_save)
+            # Only a backup chosen as the base moves the incremental chain
+            starts_chain = messagebox.askyesno(
+                "Incremental backups",
+                "Use this spreadsheet as the base of the next "
+                '"Save changes since last backup"?',
+                parent=self,
+            )
+            # The export opens its own session; it only needs the worker thread
+            db_executor.submit(
+                self.integration.export_to_spreadsheet,
+                self.spreadsheet_to_save,
+                DEFAULT_WATERMARK if starts_chain else None,
+                widget=self,
+                write=starts_chain,
+                session=False,
+                on_success=lambda counts, path=self.spreadsheet_to_save: (
+                    self.show_export_result(path)
+                ),
+                on_error=self.show_error,
+            )
+
+    def save_changes_selector(self):
+        file_path = filedialog.asksaveasfilename(
+            title="Save changes since last backup",
+            defaultextension=".xlsx",
+            filetypes=self.FILE_TYPES,
+            parent=self.root,
+        )
+        if file_path:
+            db_executor.submit(
+                self.integration.export_changes,
+                file_path,
+                widget=self,
+                write=True,
+                session=False,
+                on_success=lambda counts: self.show_export_result(file_path),
+                on_error=self.show_error,
+            )
+
+    def open_changes_selector(self):
+        # Applied over the existing rows, deleting those marked as deleted
+        file_paths = filedialog.askopenfilenames(
+            title="Select changes file",
+            filetypes=[
+                ("Spreadsheets", "*.xlsx *.csv *.csv.gz *.parquet"),
+            ]
+            + self.FILE_TYPES,
+            parent=self.root,
+        )
+        if file_paths:
+            db_executor.submit(
+                self.integration.import_changes,
+                file_paths,
+                widget=self,
+                write=True,
+                session=False,
+                on_success=self.show_import_report,
+                on_error=self.show_error,
+            )
+
+    def show_error(self, error):
+        # Unknown extension, missing sheet, locked database...
+        messagebox.showerror("Error", str(error), parent=self)
+
+    def show_export_result(self, file_path):
+        # CSV and Parquet exports write one file per sheet
+        paths = format_for(file_path).dataset_paths(file_path)
+        file_names = "\n".join(os.path.basename(path) for path in paths)
+        messagebox.showinfo("Success", f"Spreadsheet saved!\n\n{file_names}")
+
+    def import_mode(self):
+        label = self.import_mode_combo.get()
+        for mode, mode_label in self.IMPORT_MODE_LABELS.items():
+            if mode_label == label:
+                return mode
+        return "skip"
+
+    def show_import_report(self, report):
+        """One dialog summing up the import, with the conflicts to download"""
+        dialog = tk.Toplevel(self)
+        dialog.title("Importação concluída")
+        dialog.transient(self.winfo_toplevel())
+
+        ttk.Label(dialog, text=report.summary(), justify=tk.LEFT).pack(
+            padx=20, pady=15
+        )
+        buttons = ttk.Frame(dialog)
+        buttons.pack(pady=(0, 15))
+        if report.rejected or report.conflicts:
+            ttk.Button(
+                buttons,
+                text="Save conflict report",
+                command=lambda: self.save_conflict_report(report, dialog),
+            ).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Close", command=dialog.destroy).pack(
+            side=tk.LEFT, padx=5
+        )
+        dialog.grab_set()
+
+    def save_conflict_report(self, report, dialog):
+        file_path = filedialog.asksaveasfilename(
+            title="Save conflict report",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            parent=dialog,
+        )
+        if file_path:
+            report.write_conflicts(file_path)
+            messagebox.showinfo("Success", "Conflict report saved!", parent=dialog)
@@ -3,11 +3,18 @@ from tkinter import ttk
 from tkcalendar import DateEntry
 from datetime import date
 from src.IncomeAnalysis import IncomeAnalysis
-from src.models.models import Patient
-from src.utils import session_scope
+from src.db_worker import db_executor
+from src.instrumentation import ui_action
+from src.models.models import Appointment, Patient
+from src.patient_directory import patient_directory
 
 
 class StatisticsView(tk.Frame):
+    # Label format of each period shown in the trend panel
+    PERIOD_FORMATS = {"week": "%d-%m-%Y", "month": "%m-%Y", "year": "%Y"}
+    # Refreshed by the controller when these change while hidden
+    depends_on = (Patient, Appointment)
+
     def __init__(self, master, show_view_callback):
         super().__init__(master)
         self.show_view = show_view_callback
@@ -25,17 +32,13 @@ class StatisticsView(tk.Frame):
 
         # Patient filter
         tk.Label(filter_frame, text="Patient:").grid(row=0, column=0, padx=5)
-        self.patient_combo = ttk.Combobox(
-            filter_frame, values=["All"] + self.get_patient_names()
-        )
+        self.patient_combo = ttk.Combobox(filter_frame, values=["All"])
         self.patient_combo.grid(row=0, column=1, padx=5)
         self.patient_combo.set("All")  # Default to all patients
 
         # Health plan filter
         tk.Label(filter_frame, text="Health Plan:").grid(row=0, column=2, padx=5)
-        self.health_plan_combo = ttk.Combobox(
-            filter_frame, values=["All"] + self.get_health_plans()
-        )
+        self.health_plan_combo = ttk.Combobox(filter_frame, values=["All"])
         self.health_plan_combo.grid(row=0, column=3, padx=5)
         self.health_plan_combo.set("All")  # Default to all health plans
 
@@ -116,24 +119,65 @@ class StatisticsView(tk.Frame):
         )
         self.total_money_received_label.grid(row=2, column=1, sticky="w")
 
+        # Trend frame
+        trend_frame = tk.Frame(self)
+        trend_frame.pack(pady=10)
+
+        tk.Label(trend_frame, text="Trend by:").grid(row=0, column=0, padx=5)
+        self.granularity_combo = ttk.Combobox(
+            trend_frame,
+            values=list(self.PERIOD_FORMATS),
+            state="readonly",
+            width=8,
+        )
+        self.granularity_combo.grid(row=0, column=1, padx=5, sticky="w")
+        self.granularity_combo.set("month")
+        self.granularity_combo.bind(
+            "<<ComboboxSelected>>", lambda event: self.analyze_data()
+        )
+
+        self.trend_tree = ttk.Treeview(
+            trend_frame,
+            columns=("period", "attendances", "income"),
+            show="headings",
+            height=8,
+        )
+        self.trend_tree.heading("period", text="Period")
+        self.trend_tree.heading("attendances", text="Attendances")
+        self.trend_tree.heading("income", text="Income")
+        self.trend_tree.column("period", width=110, anchor="center")
+        self.trend_tree.column("attendances", width=100, anchor="e")
+        self.trend_tree.column("income", width=120, anchor="e")
+        self.trend_tree.grid(row=1, column=0, columnspan=2, pady=5)
+
+        trend_scrollbar = ttk.Scrollbar(
+            trend_frame, orient="vertical", command=self.trend_tree.yview
+        )
+        self.trend_tree.configure(yscrollcommand=trend_scrollbar.set)
+        trend_scrollbar.grid(row=1, column=2, sticky="ns", pady=5)
+
+        self.load_filter_options()
         self.analyze_data()
 
-    def get_patient_names(self):
-        """Fetch patient names from the database"""
-        with session_scope() as session:
-            patients = session.query(Patient).all()
-            return [patient.name for patient in patients]
-
-    def get_health_plans(self):
-        """Fetch unique health plans from the database"""
-        with session_scope() as session:
-            health_plans = (
-                session.query(Patient.health_plan).distinct().all()
-            )  # Fetch unique health plans
-            return [
-                plan[0] for plan in health_plans if plan[0]
-            ]  # Extract health plan names
+    def refresh(self):
+        self.load_filter_options()
+        self.analyze_data()
+
+    def load_filter_options(self):
+        """Fill the patient and health plan filters from the patient directory"""
+        db_executor.submit(
+            filter_options,
+            widget=self,
+            key=(id(self), "filter_options"),
+            on_success=self.show_filter_options,
+        )
 
+    def show_filter_options(self, options):
+        patient_names, health_plans = options
+        self.patient_combo.config(values=["All"] + patient_names)
+        self.health_plan_combo.config(values=["All"] + health_plans)
+
+    @ui_action
     def analyze_data(self):
         """Analyzes the data and updates the results labels"""
         start_date = self.start_date_entry.get_date()
@@ -144,8 +188,20 @@ class StatisticsView(tk.Frame):
         analysis = IncomeAnalysis(
             start_date, end_date, selected_patient, selected_health_plan
         )
+        db_executor.submit(
+            analyze,
+            analysis,
+            self.granularity_combo.get(),
+            widget=self,
+            key=(id(self), "analysis"),
+            session=False,
+            on_success=self.show_analysis,
+        )
+
+    def show_analysis(self, results):
+        statistics, totals = results
         total_attendances, attendances_by_health_plan, total_therapist_income = (
-            analysis.calculate_statistics()
+            statistics
         )
 
         # Format attendances by health plan
@@ -163,6 +219,7 @@ class StatisticsView(tk.Frame):
             attendances_by_health_plan_str,
             total_therapist_income,
         )
+        self.update_trend(totals)
 
     def update_results(
         self, total_attendances, attendances_by_health_plan, total_money_received
@@ -175,3 +232,32 @@ class StatisticsView(tk.Frame):
         self.total_money_received_label.config(
             text=f"R$ {total_money_received:.2f}"
         )
+
+    def update_trend(self, totals):
+        """Fill the trend panel with the totals of each period"""
+        self.trend_tree.delete(*self.trend_tree.get_children())
+        period_format = self.PERIOD_FORMATS[self.granularity_combo.get()]
+        for period, row in totals.iterrows():
+            self.trend_tree.insert(
+                "",
+                tk.END,
+                values=(
+                    period.strftime(period_format),
+                    int(row["attendances"]),
+                    f"R$ {row['income']:.2f}",
+                ),
+            )
+
+
+def filter_options(session):
+    # Loads the directory on this worker thread if needed
+    patient_directory.load(session)
+    return patient_directory.names(), patient_directory.health_plans()
+
+
+def analyze(analysis, granularity):
+    # IncomeAnalysis opens its own sessions so it can serve cached results
+    return (
+        analysis.calculate_statistics(),
+        analysis.totals_by_period(granularity),
+    )
@@ -0,0 +1,152 @@
+import math
+import tkinter as tk
+from collections import OrderedDict
+
+
+class VirtualList(tk.Frame):
+    """
+    Scrollable list that only creates the row widgets that fit in the
+    viewport and recycles them while scrolling. Row data is fetched lazily,
+    one page at a time, and only a few pages are kept in memory, so the cost
+    of a refresh does not depend on the number of rows.
+
+    Args:
+        create_row: ``create_row(parent)`` builds one empty row widget.
+        fill_row: ``fill_row(row, item)`` shows ``item`` in a recycled row.
+        count_rows: ``count_rows()`` returns the total number of rows; may be
+            None if the total is always passed to ``refresh``.
+        fetch_rows: ``fetch_rows(offset, limit)`` returns a page of items,
+            or None if the page is loaded in the background; it is then
+            handed over later through ``page_loaded(offset, items)``.
+    """
+
+    def __init__(
+        self,
+        master,
+        create_row,
+        fill_row,
+        count_rows,
+        fetch_rows,
+        row_height=36,
+        page_size=50,
+        cached_pages=8,
+        width=600,
+        height=450,
+    ):
+        super().__init__(master)
+        self.create_row = create_row
+        self.fill_row = fill_row
+        self.count_rows = count_rows
+        self.fetch_rows = fetch_rows
+        self.row_height = row_height
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+
+        self.rows = []
+        self.pages = OrderedDict()
+        self.requested_pages = set()
+        self.total = 0
+        self.top = 0
+
+        self.viewport = tk.Frame(self, width=width, height=height)
+        self.viewport.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.viewport.bind("<Configure>", lambda e: self.redraw())
+        self.bind_mouse_wheel(self.viewport)
+
+    def visible_count(self):
+        """Number of rows needed to fill the viewport"""
+        height = self.viewport.winfo_height()
+        if height <= 1:  # Not mapped yet
+            height = int(self.viewport.cget("height"))
+        return max(1, math.ceil(height / self.row_height))
+
+    def refresh(self, total=None):
+        """Forget the cached pages and reload the visible rows"""
+        self.pages.clear()
+        self.requested_pages.clear()
+        self.total = self.count_rows() if total is None else total
+        self.scroll_to(self.top, force=True)
+
+    def page_loaded(self, offset, items):
+        """Receive a page that ``fetch_rows`` loaded in the background"""
+        page = offset // self.page_size
+        self.requested_pages.discard(page)
+        self.store_page(page, items)
+        self.redraw()
+
+    def store_page(self, page, items):
+        self.pages[page] = items
+        while len(self.pages) > self.cached_pages:
+            self.pages.popitem(last=False)
+
+    def item(self, index):
+        """Return the item at ``index``, or None while its page is loading"""
+        page, position = divmod(index, self.page_size)
+        if page not in self.pages:
+            if page in self.requested_pages:
+                return None
+            items = self.fetch_rows(page * self.page_size, self.page_size)
+            if items is None:
+                self.requested_pages.add(page)
+                return None
+            self.store_page(page, items)
+        self.pages.move_to_end(page)
+        items = self.pages[page]
+        return items[position] if position < len(items) else None
+
+    def scroll_to(self, index, force=False):
+        last_top = max(0, self.total - self.visible_count() + 1)
+        index = min(max(0, index), last_top)
+        if index != self.top or force:
+            self.top = index
+            self.redraw()
+
+    def yview(self, *args):
+        """Scrollbar protocol: ("moveto", fraction) or ("scroll", n, what)"""
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.total))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= max(1, self.visible_count() - 1)
+            self.scroll_to(self.top + amount)
+
+    def redraw(self):
+        needed = self.visible_count()
+        while len(self.rows) < needed:
+            row = self.create_row(self.viewport)
+            self.bind_mouse_wheel(row)
+            self.rows.append(row)
+
+        for position, row in enumerate(self.rows):
+            index = self.top + position
+            item = self.item(index) if position < needed and index < self.total else None
+            if item is None:
+                row.place_forget()
+                continue
+            self.fill_row(row, item)
+            row.place(
+                x=0, y=position * self.row_height, relwidth=1, height=self.row_height
+            )
+
+        if self.total:
+            first = self.top / self.total
+            last = min(1.0, (self.top + needed) / self.total)
+            self.scrollbar.set(first, last)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def bind_mouse_wheel(self, widget):
+        """Scroll the list with the mouse wheel over ``widget`` and its children"""
+        widget.bind("<MouseWheel>", self.on_mouse_wheel)  # Windows and macOS
+        widget.bind("<Button-4>", lambda e: self.scroll_to(self.top - 3))  # Linux
+        widget.bind("<Button-5>", lambda e: self.scroll_to(self.top + 3))
+        for child in widget.winfo_children():
+            self.bind_mouse_wheel(child)
+
+    def on_mouse_wheel(self, event):
+        steps = -3 if event.delta > 0 else 3
+        self.scroll_to(self.top + steps)